@@ -16,14 +16,15 @@ v4 admin functions, encapsulating all logic into a single class.
 import asyncio
 import logging
 import re
-from typing import Dict, List, Optional, AsyncGenerator, Any
+from typing import Dict, List, Optional, AsyncGenerator, Any, Tuple
 from datetime import datetime, timezone, timedelta
 
 # Motor/Mongo imports
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
 from bson import ObjectId
 from bson.errors import InvalidId
-from pymongo.errors import DuplicateKeyError, ServerSelectionTimeoutError, OperationFailure
+from pymongo import ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import DuplicateKeyError, ServerSelectionTimeoutError, OperationFailure, PyMongoError
 from dotenv import load_dotenv
 import os
 import ssl
@@ -44,12 +45,34 @@ class DatabaseV6:
     Handles all Admin and Merchant data logic.
     """
 
-    def __init__(self, mongo_uri: Optional[str] = None, db_name: Optional[str] = None):
+    # Named order indexes the listing queries hint at
+    CUSTOMER_ORDERS_INDEX = "customer_phone_created_desc"
+    MERCHANT_STATUS_ORDERS_INDEX = "merchant_status_created_desc"
+    STATUS_EXPIRY_INDEX = "status_expiry_ts"
+    STATUS_CREATED_INDEX = "status_created"
+
+    # Connection pool defaults: keep warm connections so the first dashboard / order
+    # requests after idle do not pay the TCP+TLS handshake, and cap concurrent dials.
+    DEFAULT_CLIENT_OPTIONS: Dict[str, Any] = {
+        "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "100")),
+        "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "10")),
+        "maxConnecting": int(os.getenv("MONGO_MAX_CONNECTING", "4")),
+        "maxIdleTimeMS": 300_000,
+        "retryWrites": True,
+        "w": "majority",
+    }
+
+    def __init__(
+        self, mongo_uri: Optional[str] = None, db_name: Optional[str] = None,
+        client_options: Optional[Dict[str, Any]] = None
+    ):
         """
         Initialize MongoDB connection configuration.
+        'client_options' override DEFAULT_CLIENT_OPTIONS (passed to AsyncIOMotorClient).
         """
         self.mongo_uri = mongo_uri or os.getenv("MONGO_URI", "mongodb://localhost:27017")
         self.db_name = db_name or os.getenv("DB_NAME", "vyaapaar_ai_v6") # Use v6 DB name
+        self.client_options = {**self.DEFAULT_CLIENT_OPTIONS, **(client_options or {})}
 
         self.client: Optional[AsyncIOMotorClient] = None
         self.db: Optional[AsyncIOMotorDatabase] = None
@@ -71,7 +94,8 @@ class DatabaseV6:
             self.client = AsyncIOMotorClient(
                 self.mongo_uri,
                 serverSelectionTimeoutMS=5000,
-                tlsCAFile=certifi.where() if "mongodb+srv" in self.mongo_uri else None
+                tlsCAFile=certifi.where() if "mongodb+srv" in self.mongo_uri else None,
+                **self.client_options
             )
 
             # Get database
@@ -129,10 +153,17 @@ class DatabaseV6:
             orders = self.db["orders"]
             index_tasks.extend([
                 orders.create_index("order_id", unique=True),
-                orders.create_index("customer_phone"),
-                orders.create_index([("merchant_id", 1), ("status", 1)]),
+                # Compound (filter, created_at desc) indexes serve the paginated, newest-first
+                # customer/merchant listings without an in-memory sort; their prefixes still
+                # serve plain customer_phone and (merchant_id, status) lookups.
+                orders.create_index([("customer_phone", 1), ("created_at", -1)], name=self.CUSTOMER_ORDERS_INDEX),
+                orders.create_index([("merchant_id", 1), ("status", 1), ("created_at", -1)], name=self.MERCHANT_STATUS_ORDERS_INDEX),
                 orders.create_index([("merchant_id", 1), ("created_at", -1)]),
-                orders.create_index("expiry_time")
+                orders.create_index("expiry_time"),
+                # Serves the batched expiry sweep (pending + due). Not a TTL index: orders are never auto-deleted.
+                orders.create_index([("status", 1), ("expiry_time_ts", 1)], name=self.STATUS_EXPIRY_INDEX),
+                # Serves the reminder-candidate query (pending + old enough)
+                orders.create_index([("status", 1), ("created_at", 1)], name=self.STATUS_CREATED_INDEX)
             ])
             
             # Products collection (NEW v5/v6)
@@ -216,6 +247,20 @@ class DatabaseV6:
             raise RuntimeError("Database not initialized")
         return self.db[name]
 
+    async def atomic(self, *ops) -> List[Any]:
+        """
+        Run several writes as one multi-document transaction.
+        Each op is an async callable accepting 'session'; results are returned in order.
+        An exception from any op aborts the whole transaction.
+        """
+        if self.client is None: raise RuntimeError("Database not initialized")
+
+        async def _run_ops(session):
+            return [await op(session=session) for op in ops]
+
+        async with await self.client.start_session() as session:
+            return await session.with_transaction(_run_ops)
+
     async def health_check(self) -> bool:
         """
         Check if database connection is healthy.
@@ -401,6 +446,27 @@ class DatabaseV6:
         except Exception as e:
             logger.error(f"Error logging admin action: {e}")
 
+    async def record_admin_action(
+        self,
+        admin_username: str,
+        action: str,
+        details: Optional[Dict[str, Any]] = None,
+        session=None
+    ):
+        """
+        Record an admin action in the audit trail.
+        Unlike log_admin_action, errors propagate so a surrounding transaction aborts.
+        """
+        if self.db is None: raise RuntimeError("Database not initialized")
+        log_entry = {
+            "admin_username": admin_username,
+            "action": action,
+            "details": details or {},
+            "timestamp": datetime.now(timezone.utc)
+        }
+        await self.db.admin_actions.insert_one(log_entry, session=session)
+        logger.info(f"Admin action recorded: {admin_username} - {action}")
+
     async def get_all_messages_admin(self, limit: int = 100) -> List[Dict[str, Any]]:
         """
         Get recent messages from ALL merchants (admin view).
@@ -562,34 +628,43 @@ class DatabaseV6:
             if order:
                 order["_id"] = str(order["_id"])
             return order
-        except Exception as e:
+        except (PyMongoError, asyncio.TimeoutError) as e:
+            # Propagate: returning None here would make a DB outage look like "order not found"
             logger.error(f"Error retrieving order {order_id}: {e}")
-            return None
+            raise
+
+    @staticmethod
+    def _build_order_update_spec(order_data: Dict) -> Dict:
+        """
+        Normalize an order update into a Mongo update spec with 'updated_at' set.
+        Accepts either plain fields or a spec that already uses $-operators.
+        """
+        now = datetime.now(timezone.utc)
+        has_operator = any(isinstance(k, str) and k.startswith("$") for k in order_data.keys())
+
+        if has_operator:
+            update_spec = dict(order_data)
+            if "$set" not in update_spec: update_spec["$set"] = {}
+            update_spec["$set"]["updated_at"] = now
+        else:
+            fields = dict(order_data)
+            fields["updated_at"] = now
+            update_spec = {"$set": fields}
+
+        # Sanitize datetime strings
+        if "$set" in update_spec:
+            for key, value in update_spec["$set"].items():
+                if isinstance(value, str) and re.match(r'^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}', value):
+                    try:
+                        update_spec["$set"][key] = datetime.fromisoformat(value.replace("Z", "+00:00"))
+                    except ValueError:
+                        pass # Keep as string
+        return update_spec
 
     async def update_order(self, order_id: str, order_data: Dict):
         if self.db is None: raise RuntimeError("Database not initialized")
         try:
-            now = datetime.now(timezone.utc)
-            has_operator = any(isinstance(k, str) and k.startswith("$") for k in order_data.keys())
-
-            if has_operator:
-                update_spec = dict(order_data)
-                if "$set" not in update_spec: update_spec["$set"] = {}
-                update_spec["$set"]["updated_at"] = now
-            else:
-                fields = dict(order_data)
-                fields["updated_at"] = now
-                update_spec = {"$set": fields}
-            
-            # Sanitize datetime strings
-            if "$set" in update_spec:
-                for key, value in update_spec["$set"].items():
-                    if isinstance(value, str) and re.match(r'^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}', value):
-                        try:
-                            update_spec["$set"][key] = datetime.fromisoformat(value.replace("Z", "+00:00"))
-                        except ValueError:
-                            pass # Keep as string
-
+            update_spec = self._build_order_update_spec(order_data)
             result = await self.db.orders.update_one({"order_id": order_id}, update_spec)
 
             if result.matched_count == 0:
@@ -601,34 +676,150 @@ class DatabaseV6:
             logger.error(f"Error updating order {order_id}: {e}", exc_info=True)
             raise
 
-    async def get_orders_by_customer(self, customer_phone: str, limit: int = 10, status_filter: Optional[str] = None) -> List[Dict]:
+    async def update_order_if(
+        self,
+        order_id: str,
+        filter_extra: Optional[Dict],
+        order_data: Dict,
+        return_after: bool = True,
+        session=None
+    ) -> Optional[Dict]:
+        """
+        Conditionally update an order in one round-trip (find_one_and_update).
+        'filter_extra' holds the preconditions (e.g. {"status": "pending"}), so the
+        check and the write are atomic. Returns the post-image (or pre-image if
+        return_after=False), or None when no order matched the filter.
+        Pass 'session' to run it inside a transaction (see atomic()).
+        """
+        if self.db is None: raise RuntimeError("Database not initialized")
+        try:
+            query = {"order_id": order_id}
+            if filter_extra: query.update(filter_extra)
+            order = await self.db.orders.find_one_and_update(
+                query,
+                self._build_order_update_spec(order_data),
+                return_document=ReturnDocument.AFTER if return_after else ReturnDocument.BEFORE,
+                session=session
+            )
+            if order:
+                order["_id"] = str(order["_id"])
+            else:
+                logger.debug(f"Order {order_id} not updated: no match for {filter_extra}")
+            return order
+        except Exception as e:
+            logger.error(f"Error conditionally updating order {order_id}: {e}", exc_info=True)
+            raise
+
+    async def get_orders_by_ids(self, order_ids: List[str], statuses: Optional[List[str]] = None) -> List[Dict]:
+        """Fetch many orders by order_id in one query, optionally only those in 'statuses'."""
+        if self.db is None: raise RuntimeError("Database not initialized")
+        if not order_ids: return []
+        query = {"order_id": {"$in": list(order_ids)}}
+        if statuses:
+            query["status"] = {"$in": list(statuses)}
+        orders = await self.db.orders.find(query).to_list(length=len(order_ids))
+        for o in orders: o["_id"] = str(o["_id"])
+        return orders
+
+    async def bulk_update_orders_if(self, updates: List[Tuple[str, Optional[Dict], Dict]]) -> int:
+        """
+        Apply many conditional order updates in one unordered bulk_write.
+        'updates' holds (order_id, filter_extra, order_data) like update_order_if.
+        Returns the number of orders modified.
+        """
+        if self.db is None: raise RuntimeError("Database not initialized")
+        if not updates: return 0
+        ops = []
+        for order_id, filter_extra, order_data in updates:
+            query = {"order_id": order_id}
+            if filter_extra: query.update(filter_extra)
+            ops.append(UpdateOne(query, self._build_order_update_spec(order_data)))
+        try:
+            result = await self.db.orders.bulk_write(ops, ordered=False)
+            return result.modified_count
+        except Exception as e:
+            logger.error(f"Error bulk updating {len(ops)} orders: {e}", exc_info=True)
+            raise
+
+    async def mark_reminders_sent(self, order_ids_by_hour: Dict[int, List[str]]) -> int:
+        """
+        Add each reminder hour to 'sent_reminders' of its orders: one UpdateMany per hour,
+        all in a single bulk_write. Orders that already have the hour are not matched.
+        Returns the number of orders modified.
+        """
+        if self.db is None: raise RuntimeError("Database not initialized")
+        now = datetime.now(timezone.utc)
+        ops = [
+            UpdateMany(
+                {"order_id": {"$in": list(order_ids)}, "sent_reminders": {"$ne": hour}},
+                {"$addToSet": {"sent_reminders": hour}, "$set": {"updated_at": now}}
+            )
+            for hour, order_ids in order_ids_by_hour.items() if order_ids
+        ]
+        if not ops: return 0
+        try:
+            result = await self.db.orders.bulk_write(ops, ordered=False)
+            return result.modified_count
+        except Exception as e:
+            logger.error(f"Error marking reminders sent ({len(ops)} intervals): {e}", exc_info=True)
+            raise
+
+    async def get_orders_by_customer(
+        self, customer_phone: str, limit: int = 10, status_filter: Optional[str] = None,
+        projection: Optional[Dict] = None
+    ) -> List[Dict]:
         if self.db is None: raise RuntimeError("Database not initialized")
         try:
             query = {"customer_phone": customer_phone}
             if status_filter:
                 query["status"] = str(status_filter).lower()
-            cursor = self.db.orders.find(query).sort("created_at", -1).limit(limit)
+            cursor = self.db.orders.find(
+                query, projection, sort=[("created_at", -1)], hint=self.CUSTOMER_ORDERS_INDEX
+            ).limit(limit)
             orders = await cursor.to_list(length=limit)
-            for o in orders: o["_id"] = str(o["_id"])
+            for o in orders:
+                if "_id" in o: o["_id"] = str(o["_id"])
             return orders
-        except Exception as e:
+        except (PyMongoError, asyncio.TimeoutError) as e:
             logger.error(f"Error retrieving customer orders: {e}")
             return []
 
-    async def get_orders_by_merchant(self, merchant_id: str, status_filter: Optional[str] = None, limit: int = 50) -> List[Dict]:
+    async def get_orders_by_merchant(
+        self, merchant_id: str, status_filter: Optional[str] = None, limit: int = 50,
+        projection: Optional[Dict] = None
+    ) -> List[Dict]:
         if self.db is None: raise RuntimeError("Database not initialized")
         try:
             query = {"merchant_id": merchant_id}
             if status_filter:
                 query["status"] = str(status_filter).lower()
-            cursor = self.db.orders.find(query).sort("created_at", -1).limit(limit)
+            # With a status filter the (merchant_id, status, created_at) index answers the
+            # filter and the sort; without one the planner's (merchant_id, created_at) pick is right.
+            hint = self.MERCHANT_STATUS_ORDERS_INDEX if status_filter else None
+            cursor = self.db.orders.find(
+                query, projection, sort=[("created_at", -1)], hint=hint
+            ).limit(limit)
             orders = await cursor.to_list(length=limit)
-            for o in orders: o["_id"] = str(o["_id"])
+            for o in orders:
+                if "_id" in o: o["_id"] = str(o["_id"])
             return orders
-        except Exception as e:
+        except (PyMongoError, asyncio.TimeoutError) as e:
             logger.error(f"Error retrieving merchant orders: {e}")
             return []
 
+    async def aggregate_order_status_counts(self, merchant_id: str) -> Dict[str, int]:
+        """
+        Count a merchant's orders per status server-side ($group), served by the
+        (merchant_id, status) index. Returns {status: count}.
+        """
+        if self.db is None: raise RuntimeError("Database not initialized")
+        pipeline = [
+            {"$match": {"merchant_id": merchant_id}},
+            {"$group": {"_id": "$status", "n": {"$sum": 1}}}
+        ]
+        rows = await self.db.orders.aggregate(pipeline).to_list(length=None)
+        return {row["_id"]: row["n"] for row in rows}
+
     async def get_orders_by_status(self, status: str, limit: int = 1000) -> List[Dict]:
         if self.db is None: raise RuntimeError("Database not initialized")
         try:
@@ -640,22 +831,155 @@ class DatabaseV6:
             logger.error(f"Error retrieving orders by status: {e}")
             return []
 
-    async def get_orders_by_statuses(self, statuses: List[str], limit: int = 1000) -> List[Dict]:
+    async def get_orders_by_statuses(
+        self, statuses: List[str], limit: int = 1000, projection: Optional[Dict] = None
+    ) -> List[Dict]:
         """
         Get orders matching any status in the provided list (e.g., for expiry check).
+        'projection' limits the returned fields (PyMongo projection dict).
         """
         if self.db is None: raise RuntimeError("Database not initialized")
         try:
             # Use MongoDB's "$in" operator to match any status in the list
             query = {"status": {"$in": statuses}}
-            cursor = self.db.orders.find(query).limit(limit)
+            cursor = self.db.orders.find(query, projection).limit(limit)
             orders = await cursor.to_list(length=limit)
-            for o in orders: o["_id"] = str(o["_id"])
+            for o in orders:
+                if "_id" in o: o["_id"] = str(o["_id"])
             return orders
         except Exception as e:
             logger.error(f"Error retrieving orders by statuses {statuses}: {e}")
             return []
 
+    async def expire_due_orders(
+        self, pending_statuses: List[str], now_ts: float, update_spec: Dict, limit: int = 1000
+    ) -> int:
+        """
+        Apply 'update_spec' to up to 'limit' orders still in 'pending_statuses'
+        whose epoch 'expiry_time_ts' is due. One find for the ids plus one
+        update_many; the status filter is repeated so concurrent accepts win.
+        Returns the number of orders modified.
+        """
+        if self.db is None: raise RuntimeError("Database not initialized")
+        query = {"status": {"$in": pending_statuses}, "expiry_time_ts": {"$lte": now_ts}}
+        cursor = self.db.orders.find(query, {"order_id": 1, "_id": 0}).limit(limit)
+        order_ids = [o["order_id"] async for o in cursor]
+        if not order_ids:
+            return 0
+        result = await self.db.orders.update_many(
+            {"order_id": {"$in": order_ids}, "status": {"$in": pending_statuses}},
+            self._build_order_update_spec(update_spec)
+        )
+        return result.modified_count
+
+    async def get_orders_due_for_expiry(
+        self, pending_statuses: List[str], now_ts: float,
+        projection: Optional[Dict] = None, limit: int = 1000
+    ) -> List[Dict]:
+        """
+        Orders in 'pending_statuses' whose 'expiry_time_ts' is due, plus legacy
+        orders without one (the caller derives their expiry from created_at).
+        """
+        if self.db is None: raise RuntimeError("Database not initialized")
+        query = {
+            "status": {"$in": list(pending_statuses)},
+            "$or": [{"expiry_time_ts": {"$lte": now_ts}}, {"expiry_time_ts": {"$exists": False}}]
+        }
+        cursor = self.db.orders.find(query, projection, hint=self.STATUS_EXPIRY_INDEX).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    async def get_next_order_expiry_ts(self, pending_statuses: List[str], after_ts: float) -> Optional[float]:
+        """Earliest 'expiry_time_ts' after 'after_ts' among pending orders (index-only walk)."""
+        if self.db is None: raise RuntimeError("Database not initialized")
+        doc = await self.db.orders.find_one(
+            {"status": {"$in": list(pending_statuses)}, "expiry_time_ts": {"$gt": after_ts}},
+            {"expiry_time_ts": 1, "_id": 0},
+            sort=[("expiry_time_ts", 1)], hint=self.STATUS_EXPIRY_INDEX
+        )
+        return doc["expiry_time_ts"] if doc else None
+
+    async def get_orders_due_for_reminder(
+        self, pending_statuses: List[str], created_before: datetime, reminder_hours: List[int],
+        projection: Optional[Dict] = None, limit: int = 1000
+    ) -> List[Dict]:
+        """
+        Orders in 'pending_statuses' created at or before 'created_before' that have
+        not yet been sent every reminder in 'reminder_hours'.
+        """
+        if self.db is None: raise RuntimeError("Database not initialized")
+        query = {
+            "status": {"$in": list(pending_statuses)},
+            # created_at is an ISO string for orders built by OrderManager and a BSON date
+            # otherwise; comparisons only match their own type, so test both forms
+            "$or": [
+                {"created_at": {"$lte": created_before.isoformat()}},
+                {"created_at": {"$lte": created_before}}
+            ],
+            "sent_reminders": {"$not": {"$all": list(reminder_hours)}}
+        }
+        cursor = self.db.orders.find(query, projection, hint=self.STATUS_CREATED_INDEX).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    async def bulk_expire_orders(
+        self, order_ids: List[str], pending_statuses: List[str], update_spec: Dict
+    ) -> List[str]:
+        """
+        Apply 'update_spec' to those of 'order_ids' still in 'pending_statuses':
+        one find for the pending ids, then one update_many that re-checks the
+        status. Returns only the ids this call actually transitioned, so an order
+        accepted concurrently is never reported as updated.
+        """
+        if self.db is None: raise RuntimeError("Database not initialized")
+        if not order_ids: return []
+        status_filter = {"$in": list(pending_statuses)}
+        cursor = self.db.orders.find(
+            {"order_id": {"$in": list(order_ids)}, "status": status_filter}, {"order_id": 1, "_id": 0}
+        )
+        pending_ids = [o["order_id"] async for o in cursor]
+        if not pending_ids:
+            return []
+        spec = self._build_order_update_spec(update_spec)
+        result = await self.db.orders.update_many(
+            {"order_id": {"$in": pending_ids}, "status": status_filter}, spec
+        )
+        if result.modified_count == len(pending_ids):
+            return pending_ids
+        if not result.modified_count:
+            return []
+        # Some moved on between the find and the update; this call's rows are
+        # the ones carrying its own 'updated_at' stamp
+        cursor = self.db.orders.find(
+            {"order_id": {"$in": pending_ids}, "updated_at": spec["$set"]["updated_at"]},
+            {"order_id": 1, "_id": 0},
+        )
+        return [o["order_id"] async for o in cursor]
+
+    async def iter_orders_by_merchant(
+        self, merchant_id: str, projection: Optional[Dict] = None, batch_size: int = 1000
+    ) -> AsyncGenerator[Dict, None]:
+        """
+        Stream all of a merchant's orders off the cursor (fetched 'batch_size' at
+        a time) so callers can fold them without materializing a list.
+        """
+        if self.db is None: raise RuntimeError("Database not initialized")
+        cursor = self.db.orders.find({"merchant_id": merchant_id}, projection).batch_size(batch_size)
+        async for o in cursor:
+            yield o
+
+    async def iter_orders(self, status_filter: Optional[str] = None, limit: int = 100) -> AsyncGenerator[Dict, None]:
+        """
+        Stream system-wide orders (newest first) straight off the cursor, so
+        callers can stop early without buffering the whole window.
+        """
+        if self.db is None: raise RuntimeError("Database not initialized")
+        query = {}
+        if status_filter:
+            query["status"] = str(status_filter).lower()
+        cursor = self.db.orders.find(query).sort("created_at", -1).limit(limit)
+        async for o in cursor:
+            o["_id"] = str(o["_id"])
+            yield o
+
     # ========== MERCHANT (SELF) METHODS ==========
 
     async def get_merchant(self, merchant_id: str) -> Optional[Dict]:
@@ -772,6 +1096,64 @@ class DatabaseV6:
             logger.error(f"Error updating product stock: {e}", exc_info=True)
             raise
 
+    async def get_products_by_ids(self, merchant_id: str, product_ids: List[str]) -> Dict[str, Dict]:
+        """
+        Fetch many products in one query, by 'product_id' field or BSON '_id' string.
+        Returns {requested_id: product}; ids that matched nothing are left out.
+        """
+        if self.db is None: raise RuntimeError("Database not initialized")
+        if not product_ids: return {}
+        try:
+            requested = {str(pid) for pid in product_ids}
+            oids = [ObjectId(pid) for pid in requested if ObjectId.is_valid(pid)]
+            cursor = self.db.products.find({
+                "merchant_id": merchant_id,
+                "$or": [{"product_id": {"$in": list(requested)}}, {"_id": {"$in": oids}}]
+            })
+            found: Dict[str, Dict] = {}
+            for product in await cursor.to_list(length=len(requested) * 2):
+                product["_id"] = str(product["_id"])
+                if product.get("product_id") in requested:
+                    found.setdefault(product["product_id"], product)
+                if product["_id"] in requested:
+                    found.setdefault(product["_id"], product)
+            return found
+        except Exception as e:
+            logger.error(f"Error retrieving products by ids: {e}")
+            return {}
+
+    async def bulk_adjust_product_stock(self, merchant_id: str, adjustments: List[tuple]) -> List[str]:
+        """
+        Apply many relative stock changes in one bulk_write.
+        'adjustments' is a list of (bson_id_str, quantity_change). Returns the ids whose
+        change was applied: all of them when every update matched, otherwise read back
+        by the 'updated_at' stamp this call set on each update (a product deleted in the
+        meantime, or an unordered bulk_write that failed part-way). Raises if neither the
+        write nor the read-back can say what was applied.
+        """
+        if self.db is None: raise RuntimeError("Database not initialized")
+        if not adjustments: return []
+        now = datetime.now(timezone.utc)
+        oids = [ObjectId(bson_id) for bson_id, _ in adjustments]
+        operations = [
+            UpdateOne(
+                {"merchant_id": merchant_id, "_id": oid},
+                {"$inc": {"stock_qty": quantity_change}, "$set": {"updated_at": now}}
+            )
+            for oid, (_, quantity_change) in zip(oids, adjustments)
+        ]
+        try:
+            result = await self.db.products.bulk_write(operations, ordered=False)
+            if result.matched_count == len(operations):
+                return [bson_id for bson_id, _ in adjustments]
+            logger.warning(f"Bulk stock adjustment matched {result.matched_count}/{len(operations)} products for {merchant_id}")
+        except (PyMongoError, asyncio.TimeoutError) as e:
+            logger.error(f"Error in bulk stock adjustment, checking which updates landed: {e}", exc_info=True)
+        cursor = self.db.products.find(
+            {"merchant_id": merchant_id, "_id": {"$in": oids}, "updated_at": now}, {"_id": 1}
+        )
+        return [str(p["_id"]) async for p in cursor]
+
     async def update_product(self, merchant_id: str, product_id: str, updates: Dict) -> bool:
         if self.db is None: raise RuntimeError("Database not initialized")
         try:
@@ -12,7 +12,7 @@ import logging
 import os
 import asyncio
 import httpx
-from typing import Dict, List, Optional
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Union
 from datetime import datetime, timezone
 
 logger = logging.getLogger(__name__)
@@ -163,6 +163,35 @@ class WhatsAppIntegration:
         logger.info(f"Message sent to {to_phone}: {msg_id}")
         return response
     
+    async def send_whatsapp_bulk(
+        self,
+        messages: List[Tuple[str, str]],
+        max_concurrency: int = 10,
+        acquire: Optional[Callable[[], Awaitable[None]]] = None
+    ) -> List[Union[Dict, Exception]]:
+        """
+        Send many plain-text messages over the shared client's pooled connections.
+        The Cloud API takes one recipient per request, so requests are pipelined
+        (up to max_concurrency in flight) rather than merged.
+        
+        Args:
+            messages: (phone, text) pairs
+            max_concurrency: Max requests in flight
+            acquire: Optional async callable awaited before each send (e.g. a rate limiter)
+            
+        Returns:
+            Per-message API response or raised exception, in input order
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def _send(phone: str, text: str) -> Dict:
+            async with semaphore:
+                if acquire:
+                    await acquire()
+                return await self.send_whatsapp_message(phone=phone, text=text)
+        
+        return await asyncio.gather(*(_send(phone, text) for phone, text in messages), return_exceptions=True)
+    
     async def send_cart_summary(
         self,
         phone: str,
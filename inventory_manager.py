@@ -7,6 +7,7 @@ Handles atomic stock updates, batch rollbacks, admin adjustments, and analytics.
 
 import asyncio
 import logging
+from contextlib import AsyncExitStack
 from datetime import datetime, timezone
 from typing import Dict, List, Optional, Tuple
 import uuid
@@ -347,25 +348,14 @@ class InventoryManagerV6:
         if failure_reasons:
             logger.warning(f"[{role}] Batch deduction failed for {merchant_id}. Rolling back {len(successful_deductions_info)} items. Reasons: {failure_reasons}")
 
-            rollback_tasks = []
-            for deduction_info in successful_deductions_info:
-                # Add back the quantity that was successfully deducted
-                rollback_tasks.append(
-                    self.update_quantity(
-                        merchant_id=merchant_id,
-                        product_id=deduction_info["product_id"],
-                        quantity_change=deduction_info["quantity"], # Add back positive quantity
-                        change_reason="batch_deduction_rollback",
-                        role=role # Pass the role
-                    )
-                )
-
-            rollback_results = await asyncio.gather(*rollback_tasks, return_exceptions=True)
-
-            for i, res in enumerate(rollback_results):
-                 if res is not True:
-                      pid = successful_deductions_info[i]["product_id"]
-                      logger.critical(f"[{role}] CRITICAL: ROLLBACK FAILED for product {pid}. Manual intervention required. Error: {res}")
+            rolled_back, rollback_results = await self.bulk_update_quantities(
+                merchant_id,
+                [(d["product_id"], d["quantity"], "batch_deduction_rollback", role) for d in successful_deductions_info]
+            )
+            if not rolled_back:
+                for res in rollback_results:
+                    if not res["success"]:
+                        logger.critical(f"[{role}] CRITICAL: ROLLBACK FAILED for product {res['product_id']}. Manual intervention required. Error: {res.get('reason')}")
 
             processed_ids = {r["product_id"] for r in results}
             for item in items:
@@ -378,6 +368,129 @@ class InventoryManagerV6:
         logger.info(f"[{role}] Batch deduction successful for {len(successful_deductions_info)} items for {merchant_id}.")
         return True, results
 
+    async def batch_return_stock(
+        self, merchant_id: str, items: List[Dict], role: str = "merchant",
+        change_reason: str = "batch_return"
+    ) -> Tuple[bool, List[Dict]]:
+        """
+        Return stock for multiple items in one DB round-trip (mirror of batch_deduct_stock).
+        Product locks are taken in ascending product_id order, then one read and
+        one bulk write cover every item. Returns (all_returned, per-item results).
+        """
+        results = []
+        quantities: Dict[str, float] = {}
+
+        for item in items or []:
+            product_id = item.get("product_id")
+            try:
+                quantity = abs(float(item.get("quantity")))
+            except (ValueError, TypeError):
+                results.append({"product_id": product_id, "success": False, "reason": f"Invalid quantity: {item.get('quantity')}"})
+                continue
+            if not product_id:
+                results.append({"product_id": product_id, "success": False, "reason": "Missing product_id"})
+            elif quantity == 0:
+                results.append({"product_id": product_id, "success": True, "reason": "Zero quantity"})
+            else:
+                quantities[product_id] = quantities.get(product_id, 0.0) + quantity
+
+        if not quantities:
+            return all(r["success"] for r in results), results
+
+        success, adjusted = await self.bulk_update_quantities(
+            merchant_id, [(product_id, qty, change_reason, role) for product_id, qty in quantities.items()]
+        )
+        results.extend(adjusted)
+        success = success and all(r["success"] for r in results)
+        if success:
+            logger.info(f"[{role}] Batch return ({change_reason}) successful for {len(quantities)} items for {merchant_id}.")
+        else:
+            logger.error(f"[{role}] Batch return ({change_reason}) incomplete for {merchant_id}: {[r for r in results if not r['success']]}")
+        return success, results
+
+    async def bulk_update_quantities(
+        self, merchant_id: str, adjustments: List[Tuple[str, float, str, str]]
+    ) -> Tuple[bool, List[Dict]]:
+        """
+        Apply many relative stock changes in one bulk write.
+        'adjustments' is a list of (product_id, quantity_change, change_reason, role).
+        Meant for returns/rollbacks: there is no insufficient-stock check, use
+        update_quantity / batch_deduct_stock for guarded deductions.
+        Product locks are taken in ascending product_id order, then one read and
+        one bulk write cover every product. Returns (all_applied, per-product results);
+        a product is reported as a success only if its $inc actually landed.
+        """
+        results = []
+        merged: Dict[str, List] = {}  # product_id -> [quantity_change, change_reason, role]
+        for product_id, quantity_change, change_reason, role in adjustments:
+            if product_id in merged:
+                merged[product_id][0] += quantity_change
+            else:
+                merged[product_id] = [quantity_change, change_reason, role]
+        if not merged:
+            return True, results
+
+        product_ids = sorted(merged)
+        try:
+            async with AsyncExitStack() as stack:
+                for product_id in product_ids:
+                    await stack.enter_async_context(await self._get_lock(f"{merchant_id}:{product_id}"))
+
+                products = await self.db.get_products_by_ids(merchant_id, product_ids)
+                bulk = []
+                for product_id in product_ids:
+                    product = products.get(product_id)
+                    if not product:
+                        results.append({"product_id": product_id, "success": False, "reason": "Product not found"})
+                        continue
+                    bulk.append((product["_id"], merged[product_id][0]))
+
+                try:
+                    applied = set(await self.db.bulk_adjust_product_stock(merchant_id, bulk))
+                except Exception as e:
+                    # The write may have partly landed and could not be read back: outcome unknown
+                    logger.critical(f"CRITICAL: Bulk stock update for {merchant_id} unverified. Manual intervention required. Error: {e}", exc_info=True)
+                    results.extend(
+                        {"product_id": pid, "success": False, "reason": f"Unverified, manual check required: {e}"}
+                        for pid in product_ids if pid in products
+                    )
+                    return False, results
+
+                movements = []
+                now = datetime.now(timezone.utc)
+                for product_id in product_ids:
+                    product = products.get(product_id)
+                    if not product:
+                        continue
+                    if product["_id"] not in applied:
+                        results.append({"product_id": product_id, "success": False, "reason": "Stock update not applied (product removed or write failed)"})
+                        continue
+                    quantity_change, change_reason, role = merged[product_id]
+                    old_stock = float(product.get("stock_qty", 0))
+                    movements.append({
+                        "merchant_id": merchant_id,
+                        "product_id": product_id,
+                        "product_name": product.get("product_name"),
+                        "movement_type": change_reason,
+                        "quantity_change": quantity_change,
+                        "old_stock": old_stock,
+                        "new_stock": old_stock + quantity_change,
+                        "role": role,
+                        "timestamp": now
+                    })
+                    results.append({"product_id": product_id, "success": True})
+                await self._log_stock_movements(movements)
+
+        except Exception as e:
+            logger.critical(f"CRITICAL: Bulk stock update failed for {merchant_id}. Manual intervention required. Error: {e}", exc_info=True)
+            done = {r["product_id"] for r in results}
+            results.extend(
+                {"product_id": pid, "success": False, "reason": str(e)} for pid in product_ids if pid not in done
+            )
+            return False, results
+
+        return all(r["success"] for r in results), results
+
     # --------------------------------------------------
     # Product Management & Low Stock (Preserved from v5)
     # --------------------------------------------------
@@ -531,6 +644,17 @@ class InventoryManagerV6:
         except Exception as e:
              logger.error(f"Failed to log stock movement for {product_id}: {e}", exc_info=True)
 
+    async def _log_stock_movements(self, movements: List[Dict]):
+        """Log several stock movements with a single insert_many."""
+        if not movements: return
+        if not self.db or not self.db._initialized:
+             logger.error("DB not initialized, cannot log stock movements."); return
+        try:
+            movements_collection = self.db.get_collection("stock_movements")
+            await movements_collection.insert_many(movements)
+        except Exception as e:
+             logger.error(f"Failed to log {len(movements)} stock movements: {e}", exc_info=True)
+
     async def get_stock_movement_history(
         self, merchant_id: str, product_id: Optional[str] = None, limit: int = 50
     ) -> List[Dict]:
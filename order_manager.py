@@ -10,14 +10,30 @@ Features:
 - Atomic inventory deduction and rollback on all state changes.
 - Role-aware auditing for all inventory and status modifications.
 - Integrated with unified v6 DB, Inventory, Knowledge, and Rules engines.
+
+Lock ordering (keep it this way to stay deadlock-free):
+- Order lock first, then inventory product locks. Never the reverse.
+- Product locks are taken in ascending product_id order, so items are
+  sorted by product_id before they are handed to the inventory manager.
+- Never await a lifecycle method that takes the same order lock from inside
+  another one; schedule it with _spawn() so it runs after the caller is done.
 """
 
 import asyncio
 import logging
-from typing import Dict, List, Optional, Tuple
+from abc import ABC, abstractmethod
+from collections import Counter, deque
+from contextlib import AsyncExitStack, asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, FrozenSet, List, Optional, Tuple
 from datetime import datetime, timedelta, timezone
 from enum import Enum
-import uuid
+from functools import lru_cache
+import secrets
+import time
+
+import numpy as np
+from pymongo.errors import PyMongoError
 
 # Use the v6 logger name as specified
 logger = logging.getLogger("order_manager_v6")
@@ -34,6 +50,241 @@ class OrderStatus(str, Enum):
     REVIEW = "review"  # Added from admin spec
 
 
+# Plain string values for the hot validation/update paths
+_PENDING = OrderStatus.PENDING.value
+_ACCEPTED = OrderStatus.ACCEPTED.value
+_DECLINED = OrderStatus.DECLINED.value
+_COMPLETED = OrderStatus.COMPLETED.value
+_CANCELLED = OrderStatus.CANCELLED.value
+_EXPIRED = OrderStatus.EXPIRED.value
+_REVIEW = OrderStatus.REVIEW.value
+
+# Status groups, built once at import
+_PENDING_STATUSES: Tuple[str, ...] = (_PENDING, "pending_confirmation")  # incl. legacy v5 status
+_APPROVABLE_STATUSES: Tuple[str, ...] = (_PENDING, _REVIEW)
+_CLOSED_STATUSES: FrozenSet[str] = frozenset((_COMPLETED, _CANCELLED, _EXPIRED))
+_ADMIN_CANCEL_FINAL_STATUSES: FrozenSet[str] = frozenset((_CANCELLED, _COMPLETED))  # admin may still cancel expired
+
+# Template for per-merchant status counts; copy() before filling in
+_STATUS_ZERO_SUMMARY: Dict[str, int] = {s.value: 0 for s in OrderStatus} | {"unknown": 0}  # "unknown": no status
+_STATUS_VALUES: FrozenSet[str] = frozenset(_STATUS_ZERO_SUMMARY)
+
+# Fields ReminderSystem reads from pending orders (reminders + expiry notices).
+# Leaves out the timeline and other bulky fields.
+_EXPIRY_CHECK_PROJECTION = {
+    "_id": 0, "order_id": 1, "merchant_id": 1, "customer_phone": 1, "customer_name": 1,
+    "status": 1, "created_at": 1, "expiry_time": 1, "expiry_time_ts": 1, "sent_reminders": 1,
+    "total_amount": 1, "items.product_name": 1, "items.quantity": 1
+}
+
+# Fields shown by order listings (dashboard, customer history); leaves out the timeline
+# and internal bookkeeping so list pages do not ship the full order history per row.
+_ORDER_LIST_PROJECTION = {
+    "_id": 0, "order_id": 1, "merchant_id": 1, "customer_phone": 1, "customer_name": 1,
+    "delivery_address": 1, "items": 1, "total_amount": 1, "item_count": 1, "status": 1,
+    "notes": 1, "created_at": 1, "updated_at": 1, "confirmed_at": 1, "expiry_time": 1
+}
+
+# Receipt rule and fixed header lines
+_SEP = "=" * 30
+_RECEIPT_HEADER = ("*ORDER RECEIPT*", _SEP)
+
+# Driver-level failures the read utilities log and absorb; anything else is a bug and propagates
+_DB_ERRORS = (PyMongoError, asyncio.TimeoutError)
+
+# How long a merchant's status summary is served from cache (status changes drop it earlier)
+_STATS_TTL_SECONDS = 60
+
+
+class OrderNotFound(ValueError):
+    """The order does not exist."""
+
+
+class Unauthorized(ValueError):
+    """The order belongs to a different merchant."""
+
+
+class InvalidStatus(ValueError):
+    """The order's current status does not allow the requested action."""
+
+
+# Cap on stored timeline entries per order, so documents (and get_order reads) stay bounded
+_TIMELINE_MAX = 100
+
+
+@dataclass(slots=True)
+class TimelineEntry:
+    """One entry of an order's status timeline (the single place its shape is defined)."""
+    status: str
+    timestamp: str
+    note: str
+    actor: str
+
+    def to_dict(self) -> Dict:
+        """Convert to dictionary for persistence."""
+        return {"status": self.status, "timestamp": self.timestamp, "note": self.note, "actor": self.actor}
+
+    def to_push(self) -> Dict:
+        """$push spec that appends this entry and keeps only the newest _TIMELINE_MAX entries."""
+        return {"$each": [self.to_dict()], "$slice": -_TIMELINE_MAX}
+
+
+class FastLock:
+    """
+    Drop-in for asyncio.Lock (acquire/release/locked) tuned for the uncontended case.
+    A free lock is taken without creating a Future; only waiters allocate one.
+    release() hands ownership straight to the oldest waiter, so a woken waiter
+    never has to re-check and cannot be overtaken.
+    """
+
+    __slots__ = ("_locked", "_waiters")
+
+    def __init__(self):
+        self._locked = False
+        self._waiters: deque = deque()
+
+    def locked(self) -> bool:
+        return self._locked
+
+    async def acquire(self) -> bool:
+        if not self._locked and not self._waiters:
+            self._locked = True  # Fast path: nothing awaited, no Future allocated
+            return True
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self.release()  # Ownership was handed to us just before cancel; pass it on
+            else:
+                try:
+                    self._waiters.remove(fut)
+                except ValueError:
+                    pass
+            raise
+        return True
+
+    def release(self):
+        if not self._locked:
+            raise RuntimeError("Lock is not acquired.")
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(True)  # Hand-off: lock stays held by the waiter
+                return
+        self._locked = False
+
+    async def __aenter__(self):
+        await self.acquire()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class AsyncRWLock:
+    """
+    Reader/writer lock for asyncio (the stdlib has none).
+    Any number of readers may hold it at once; a writer holds it alone.
+    Waiting writers block new readers so status changes are not starved
+    by dashboard polling.
+    """
+
+    def __init__(self):
+        self._cond = asyncio.Condition(FastLock())
+        self.reader_count = 0
+        self.writers_waiting = 0
+        self._writer_active = False
+
+    @asynccontextmanager
+    async def read_locked(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: not self._writer_active and self.writers_waiting == 0)
+            self.reader_count += 1
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self.reader_count -= 1
+                if self.reader_count == 0:
+                    self._cond.notify_all()
+
+    @asynccontextmanager
+    async def write_locked(self):
+        async with self._cond:
+            self.writers_waiting += 1
+            try:
+                await self._cond.wait_for(lambda: not self._writer_active and self.reader_count == 0)
+            finally:
+                self.writers_waiting -= 1
+                # Readers may be parked on writers_waiting if we were cancelled
+                self._cond.notify_all()
+            self._writer_active = True
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self._writer_active = False
+                self._cond.notify_all()
+
+
+class AsyncBatcher(ABC):
+    """
+    Coalesce single-item async requests into one process_batch() call per window.
+    add() resolves with that item's result once its batch has been processed.
+    A batch flushes 'window_seconds' after its first item, or at 'max_batch' items.
+    """
+
+    def __init__(self, window_seconds: float = 0.05, max_batch: int = 500):
+        self.window_seconds = window_seconds
+        self.max_batch = max_batch
+        self._pending: List[Tuple[object, asyncio.Future]] = []
+        self._timer: Optional[asyncio.Task] = None
+
+    @abstractmethod
+    async def process_batch(self, batch: List) -> Dict:
+        """Handle a batch of items; return {item: result}."""
+
+    async def add(self, item):
+        fut = asyncio.get_running_loop().create_future()
+        self._pending.append((item, fut))
+        if len(self._pending) >= self.max_batch:
+            await self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+        return await fut
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.window_seconds)
+        self._timer = None
+        await self._flush()
+
+    async def _flush(self):
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        try:
+            results = await self.process_batch([item for item, _ in batch])
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done(): fut.set_exception(e)
+            return
+        for item, fut in batch:
+            if not fut.done(): fut.set_result(results.get(item))
+
+
+class ExpiryBatcher(AsyncBatcher):
+    """Batches expire requests for an OrderManagerV6 into one bulk expiry write per window."""
+
+    def __init__(self, manager: "OrderManagerV6", **kwargs):
+        super().__init__(**kwargs)
+        self.manager = manager
+
+    async def process_batch(self, batch: List[str]) -> Dict[str, bool]:
+        expired = set(await self.manager._expire_orders_bulk(batch))
+        return {order_id: order_id in expired for order_id in batch}
+
+
 class OrderManagerV6:
     """
     Manages the complete, role-aware order lifecycle (v6).
@@ -56,29 +307,269 @@ class OrderManagerV6:
         self.knowledge = knowledge_detector
         self.rules = rules_engine  # Use self.rules as per v6 spec
         self.alerts = alert_system
-        # Fine-grained lock from v5 to prevent race conditions on *individual* orders
-        self._order_lock = asyncio.Lock()
+        # Optional collaborator capabilities, resolved once instead of hasattr() per call
+        self._has_record_admin_action = callable(getattr(db, "record_admin_action", None))
+        self._has_status_aggregation = callable(getattr(db, "aggregate_order_status_counts", None))
+        self._has_evaluate_order = callable(getattr(rules_engine, "evaluate_order", None))
+        self._has_update_knowledge = callable(getattr(knowledge_detector, "update_context_after_order_accepted", None))
+        # Per-order reader/writer locks: order_id -> (lock, refcount). Only operations
+        # on the *same* order contend, and status reads do not block each other.
+        self._order_locks: Dict[str, Tuple[AsyncRWLock, int]] = {}
+        # Strong references to background tasks so they are not garbage collected
+        self._bg_tasks: set = set()
+        # Short-lived read cache: order_id -> (doc, monotonic_ts). Dropped on every local write.
+        self._order_cache: Dict[str, Tuple[Dict, float]] = {}
+        # Merchant status summaries: merchant_id -> (monotonic_ts, stats). One lock per
+        # merchant so concurrent dashboard hits share a single aggregation.
+        self._stats_cache: Dict[str, Tuple[float, Dict]] = {}
+        self._stats_locks: Dict[str, Tuple[asyncio.Lock, int]] = {}  # merchant_id -> (lock, refcount)
+        self._sweeper_task: Optional[asyncio.Task] = None
+        self._expiry_batcher = ExpiryBatcher(self)
+        self._order_created_listeners: List[Callable[[Dict], None]] = []
         logger.info("Initialized unified OrderManagerV6 (Admin + Merchant)")
 
-    async def update_order(self, order_id: str, update_data: Dict):
+    def add_order_created_listener(self, callback: Callable[[Dict], None]):
+        """Register a synchronous callback run with each newly created order (e.g. ReminderSystem wake-up)."""
+        self._order_created_listeners.append(callback)
+
+    @asynccontextmanager
+    async def _get_order_lock(self, order_id: str, write: bool = True):
         """
-        Internal helper to update an order and ensure 'updated_at' is set.
-        (from v5)
+        Hold the lock for a single order_id (exclusive by default, shared if write=False).
+        The entry is refcounted and dropped once no coroutine holds or waits on it.
+        No await between lookup and refcount update, so the map needs no guard lock.
+        """
+        lock, refs = self._order_locks.get(order_id, (None, 0))
+        if lock is None:
+            lock = AsyncRWLock()
+        self._order_locks[order_id] = (lock, refs + 1)
+        try:
+            async with (lock.write_locked() if write else lock.read_locked()):
+                yield
+        finally:
+            lock, refs = self._order_locks[order_id]
+            if refs <= 1:
+                del self._order_locks[order_id]
+            else:
+                self._order_locks[order_id] = (lock, refs - 1)
+
+    @asynccontextmanager
+    async def _get_stats_lock(self, merchant_id: str):
+        """Hold the stats-aggregation lock for one merchant; refcounted like _get_order_lock."""
+        lock, refs = self._stats_locks.get(merchant_id, (None, 0))
+        if lock is None:
+            lock = asyncio.Lock()
+        self._stats_locks[merchant_id] = (lock, refs + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, refs = self._stats_locks[merchant_id]
+            if refs <= 1:
+                del self._stats_locks[merchant_id]
+            else:
+                self._stats_locks[merchant_id] = (lock, refs - 1)
+
+    def _spawn(self, coro) -> asyncio.Task:
+        """Run a coroutine in the background, keeping a reference until it finishes."""
+        task = asyncio.create_task(coro)
+        self._bg_tasks.add(task)
+        task.add_done_callback(self._bg_tasks.discard)
+        return task
+
+    @staticmethod
+    def _is_expired(order: Dict, now: Optional[datetime] = None) -> bool:
+        """
+        Pure expiry check for an order document. No DB writes, no locks.
+        Uses the epoch 'expiry_time_ts' when present; ISO parsing is only for legacy orders.
+        """
+        now = now or datetime.now(timezone.utc)
+        expiry_ts = order.get("expiry_time_ts")
+        if expiry_ts is not None:
+            return now.timestamp() >= expiry_ts
+        expiry = _parse_iso_datetime(order.get("expiry_time"))
+        return expiry is not None and now >= expiry
+
+    async def update_order(self, order_id: str, update_data: Dict) -> Optional[Dict]:
+        """
+        Back-compat shim for external callers passing either plain fields or a
+        raw Mongo update document. Lifecycle methods use _apply_set_push.
+        Returns the updated order (None if it does not exist), so callers need no reload.
         """
         if not order_id: raise ValueError("order_id is required")
-        if not update_data: logger.warning(f"No update data for order {order_id}"); return
+        if not update_data: logger.warning(f"No update data for order {order_id}"); return None
         try:
-            final_update = update_data.copy()
-            if "$set" not in final_update and not any(op.startswith('$') for op in final_update):
-                 final_update = {"$set": final_update}
-            final_update.setdefault("$set", {})["updated_at"] = datetime.now(timezone.utc).isoformat()
-
-            await self.db.update_order(order_id, final_update)
-            logger.debug(f"Order {order_id} updated via db layer.")
+            if "$set" in update_data or any(op.startswith('$') for op in update_data):
+                updated = await self._apply_raw(order_id, dict(update_data))
+            else:
+                updated = await self._apply_raw(order_id, {"$set": dict(update_data)})
+            logger.debug("Order %s updated via db layer.", order_id)
+            return updated
         except Exception as e:
             logger.error(f"Error in OrderManager.update_order for {order_id}: {e}", exc_info=True)
             raise
 
+    async def bulk_update_orders(self, updates: List[Tuple[str, Dict]]) -> int:
+        """
+        Apply many unconditional (order_id, update_data) updates in one bulk_write.
+        update_data takes the same forms as update_order. Returns the number modified.
+        """
+        if not updates: return 0
+        _, now_iso = _utc_now_pair()
+        ops = []
+        status_changed = False
+        for order_id, update_data in updates:
+            if not order_id: raise ValueError("order_id is required")
+            mongo_ops = dict(update_data) if any(op.startswith('$') for op in update_data) else {"$set": dict(update_data)}
+            mongo_ops["$set"] = {**mongo_ops.get("$set", {}), "updated_at": now_iso}
+            status_changed = status_changed or "status" in mongo_ops["$set"]
+            ops.append((order_id, None, mongo_ops))
+            self._order_cache.pop(order_id, None)
+        if status_changed:
+            self._stats_cache.clear()
+        modified = await self.db.bulk_update_orders_if(ops)
+        logger.debug("Bulk updated %s/%s orders", modified, len(ops))
+        return modified
+
+    async def mark_reminders_sent(self, order_ids_by_hour: Dict[int, List[str]]) -> int:
+        """Record sent reminders as one server-side update per reminder hour. Returns orders modified."""
+        if not order_ids_by_hour: return 0
+        for order_ids in order_ids_by_hour.values():
+            for order_id in order_ids:
+                self._order_cache.pop(order_id, None)
+        return await self.db.mark_reminders_sent(order_ids_by_hour)
+
+    async def _apply_raw(self, order_id: str, mongo_ops: Dict, now_iso: Optional[str] = None) -> Optional[Dict]:
+        """
+        Apply a caller-built Mongo update document as-is (updated_at is injected in place).
+        One find_one_and_update round-trip; returns the post-update order.
+        """
+        mongo_ops.setdefault("$set", {})["updated_at"] = now_iso or _utc_now_pair()[1]
+        self._order_cache.pop(order_id, None)
+        updated = await self.db.update_order_if(order_id, None, mongo_ops)
+        if updated and "status" in mongo_ops["$set"]:
+            self._stats_cache.pop(updated.get("merchant_id"), None)
+        return updated
+
+    async def _apply_set_push(
+        self,
+        order_id: str,
+        set_fields: Dict,
+        push_fields: Optional[Dict] = None,
+        filter_extra: Optional[Dict] = None,
+        now_iso: Optional[str] = None,
+        session=None
+    ) -> Optional[Dict]:
+        """
+        Apply a lifecycle $set/$push, only if the order still matches 'filter_extra'.
+        set_fields is built fresh by each caller, so updated_at is written into it
+        directly rather than into a copy.
+        Single round-trip: returns the updated order, or None if the precondition failed.
+        """
+        set_fields["updated_at"] = now_iso or _utc_now_pair()[1]
+        ops = {"$set": set_fields}
+        if push_fields:
+            ops["$push"] = push_fields
+        self._order_cache.pop(order_id, None)
+        updated = await self.db.update_order_if(order_id, filter_extra or {}, ops, session=session)
+        if updated and "status" in set_fields:
+            self._stats_cache.pop(updated.get("merchant_id"), None)
+        return updated
+
+    async def _get_order_cached(self, order_id: str, max_age_ms: int = 100) -> Optional[Dict]:
+        """
+        db.get_order behind a tiny TTL cache, for back-to-back reads of the same
+        order (dashboard polling, pre-checks). Only use it where a stale status is
+        harmless, i.e. the subsequent write re-checks status in its filter.
+        """
+        hit = self._order_cache.get(order_id)
+        now = time.monotonic()
+        if hit and (now - hit[1]) * 1000 < max_age_ms:
+            return hit[0]
+        order = await self.db.get_order(order_id)
+        if order:
+            self._order_cache[order_id] = (order, now)
+        else:
+            self._order_cache.pop(order_id, None)
+        return order
+
+    async def _safe_update_knowledge(self, order: Dict):
+        """Post-accept knowledge-base hook; failures are logged, never raised."""
+        try:
+            if self._has_update_knowledge:
+                await self.knowledge.update_context_after_order_accepted(order)
+        except Exception as e:
+            logger.warning(f"Failed to update knowledge base for {order.get('order_id')}: {e}")
+
+    async def _safe_record_admin_action(self, admin_user: str, action: str, details: Dict):
+        """Audit-log write for background use; failures are logged, never raised."""
+        try:
+            await self.db.record_admin_action(admin_user, action, details)
+        except Exception as e:
+            logger.error(f"Failed to record admin action {action} by {admin_user} ({details}): {e}")
+
+    async def _safe_evaluate_rules(self, order: Dict, context: Optional[str] = None):
+        """Post-accept business-rules hook; failures are logged, never raised."""
+        try:
+            # v6: Use self.rules (from __init__)
+            if self._has_evaluate_order:
+                await self.rules.evaluate_order(order)
+        except Exception as e:
+            suffix = f" ({context})" if context else ""
+            logger.warning(f"Error evaluating business rules for {order.get('order_id')}{suffix}: {e}")
+
+    async def _evaluate_rules_for(self, order_ids: List[str], context: str):
+        """Background helper: one fetch, then the rules hook for each order."""
+        try:
+            orders = await self.db.get_orders_by_ids(order_ids)
+        except Exception as e:
+            logger.warning(f"Could not load orders for rules evaluation ({context}): {e}"); return
+        await asyncio.gather(*(self._safe_evaluate_rules(o, context) for o in orders))
+
+    @staticmethod
+    def _classify_rollback_results(items: List[Dict], results: List) -> Tuple[bool, List[Dict]]:
+        """
+        Single pass over per-item stock-return results (result dicts, or raised
+        exceptions positionally matching 'items'). Returns (all_ok, failures) where
+        each failure names the product and the reason, ready for logging.
+        """
+        failures = []
+        for i, r in enumerate(results):
+            if isinstance(r, BaseException):
+                product_id = items[i].get("product_id") if i < len(items) else None
+                failures.append({"product_id": product_id, "reason": repr(r)})
+            elif not r.get("success"):
+                failures.append({"product_id": r.get("product_id"), "reason": r.get("reason")})
+        return not failures, failures
+
+    async def _validate_order_precondition(
+        self,
+        order_id: str,
+        merchant_id: Optional[str],
+        allowed_statuses=None,
+        require_merchant: bool = True,
+        action: str = "processed",
+        blocked_statuses=(),
+        cached: bool = False
+    ) -> Dict:
+        """
+        Shared fetch -> exists -> owner -> status check for lifecycle methods.
+        Returns the order or raises OrderNotFound / Unauthorized / InvalidStatus
+        (all ValueError subclasses, so API handlers still map them to 400).
+        Also used after a conditional update matched nothing, to report why.
+        cached=True reads through _get_order_cached (pre-checks only).
+        """
+        order = await (self._get_order_cached(order_id) if cached else self.db.get_order(order_id))
+        if not order:
+            raise OrderNotFound(f"Order {order_id} not found")
+        if require_merchant and order.get("merchant_id") != merchant_id:
+            logger.warning(f"Unauthorized {action}: {merchant_id} vs {order.get('merchant_id')}")
+            raise Unauthorized(f"Unauthorized: Order does not belong to merchant {merchant_id}")
+        status = order.get("status")
+        if (allowed_statuses is not None and status not in allowed_statuses) or status in blocked_statuses:
+            raise InvalidStatus(f"Order {order_id} cannot be {action} (status: {status})")
+        return order
+
     # --------------------------------------------------
     # MERCHANT OPERATIONS (from v5, with v6 updates)
     # --------------------------------------------------
@@ -104,7 +595,7 @@ class OrderManagerV6:
             raise ValueError("Cart must have at least one item")
 
         order_id = self._generate_order_id()
-        now_utc = datetime.now(timezone.utc)
+        now_utc, now_iso = _utc_now_pair()
         expiry_time = now_utc + timedelta(hours=ttl_hours)
 
         order = {
@@ -117,30 +608,33 @@ class OrderManagerV6:
             "items": cart_data.get("items", []),
             "total_amount": float(cart_data.get("total", 0.0)),
             "item_count": int(cart_data.get("item_count", 0)),
-            "status": OrderStatus.PENDING.value,
+            "status": _PENDING,
             "confirmed_at": None,
             "inventory_deducted": False,
             "notes": notes,
-            "created_at": now_utc.isoformat(),
-            "updated_at": now_utc.isoformat(),
+            "created_at": now_iso,
+            "updated_at": now_iso,
             "expiry_time": expiry_time.isoformat(),
+            "expiry_time_ts": expiry_time.timestamp(),  # Epoch seconds, cheap expiry compare
             "timeline": [
-                {
-                    "status": OrderStatus.PENDING.value,
-                    "timestamp": now_utc.isoformat(),
-                    "note": "Order created and awaiting merchant confirmation",
-                    "actor": "system"
-                }
+                TimelineEntry(_PENDING, now_iso, "Order created and awaiting merchant confirmation", "system").to_dict()
             ]
         }
         try:
             await self.db.create_order(order)
+            self._stats_cache.pop(merchant_id, None)
             logger.info(
-                f"Created order {order_id} for {merchant_id}: {order['item_count']} items, Rs.{order['total_amount']:.2f}"
+                "Created order %s for %s: %s items, Rs.%.2f",
+                order_id, merchant_id, order['item_count'], order['total_amount']
             )
         except Exception as e:
             logger.error(f"Failed to create order in DB for {order_id}: {e}", exc_info=True)
             raise
+        for callback in self._order_created_listeners:
+            try:
+                callback(order)
+            except Exception as e:
+                logger.warning(f"Order-created listener failed for {order_id}: {e}")
         return order
 
     async def accept_order(
@@ -157,39 +651,29 @@ class OrderManagerV6:
         """
         if not order_id or not merchant_id:
             raise ValueError("order_id and merchant_id required")
+        now_utc, now_iso = _utc_now_pair()
 
-        # --- Step 1: Read Order (No Lock) ---
-        order = await self.db.get_order(order_id)
-        if not order:
-            raise ValueError(f"Order {order_id} not found")
-        if order.get("merchant_id") != merchant_id:
-            logger.warning(f"Unauthorized accept: {merchant_id} vs {order.get('merchant_id')}")
-            raise ValueError(f"Unauthorized: Order does not belong to merchant {merchant_id}")
-
-        # --- Step 2: Validate Status & Expiry (No Lock) ---
-        if order.get("status") != OrderStatus.PENDING.value:
-            raise ValueError(f"Order {order_id} is not in pending state (current: {order.get('status')})")
+        # --- Step 1: Read Order (Shared Order Lock) ---
+        async with self._get_order_lock(order_id, write=False):
+            # --- Step 2: Validate Status & Expiry (Shared Order Lock) ---
+            order = await self._validate_order_precondition(
+                order_id, merchant_id, (_PENDING,), action="accepted", cached=True
+            )
 
-        if order.get("expiry_time"):
-            try:
-                expiry = await self._parse_iso_datetime(order["expiry_time"])
-                if expiry and datetime.now(timezone.utc) >= expiry:
-                    # Try to expire it, but raise error regardless
-                    try: await self.expire_order(order_id)
-                    except Exception: pass  # Ignore errors if already expired etc.
-                    raise ValueError(f"Order {order_id} has expired")
-            except Exception as e:
-                 logger.error(f"Error checking expiry for {order_id}: {e}")
-                 if "expired" in str(e): raise
+            if self._is_expired(order, now_utc):
+                # The status flip itself is left to the expiry sweep / ReminderSystem.
+                raise InvalidStatus(f"Order {order_id} has expired")
 
         if estimated_delivery:
             if not isinstance(estimated_delivery, datetime): raise ValueError("estimated_delivery must be datetime")
             if estimated_delivery.tzinfo is None: estimated_delivery = estimated_delivery.replace(tzinfo=timezone.utc)
-            if estimated_delivery <= datetime.now(timezone.utc): raise ValueError("Estimated delivery must be in the future")
+            if estimated_delivery <= now_utc: raise ValueError("Estimated delivery must be in the future")
 
         # --- Step 3: Deduct Inventory (No Order Lock) ---
-        # This is the slow I/O operation. It uses its *own* fine-grained product locks.
-        items_to_deduct = order.get("items", [])
+        # This is the slow I/O operation. It uses its *own* fine-grained product locks,
+        # so items go in canonical product_id order.
+        items = order.get("items") or []
+        items_to_deduct = sorted(items, key=lambda i: str(i.get("product_id")))
         deduction_success, deduction_results = await self.inventory.batch_deduct_stock(
             merchant_id=merchant_id,
             items=items_to_deduct,
@@ -211,81 +695,48 @@ class OrderManagerV6:
 
         # --- Step 4: Update Order Status (Acquire Order Lock) ---
         # Now that all slow I/O is done, acquire the lock for the final, fast state change.
-        async with self._order_lock:
-            # Re-check status *inside the lock* in case of race condition
-            current_order_state = await self.db.get_order(order_id)
-            if current_order_state.get("status") != OrderStatus.PENDING.value:
-                # Another process (e.g., expiry) got here first.
-                # We must roll back the inventory.
-                logger.critical(f"Order {order_id} state changed to {current_order_state.get('status')} during inventory deduction! Rolling back.")
-                rollback_tasks = [
-                    self.inventory.update_quantity(
-                        merchant_id=merchant_id,
-                        product_id=item.get("product_id"),
-                        quantity_change=float(item.get("quantity", 0)),
-                        change_reason="order_accept_race_condition_rollback",
-                        role="merchant"  # v6: Specify role
-                    ) for item in items_to_deduct
-                ]
-                await asyncio.gather(*rollback_tasks, return_exceptions=True)
-                raise ValueError(f"Order state changed mid-process (now {current_order_state.get('status')}). Inventory rolled back.")
-
-            # All clear. Commit the final status update.
-            now_utc = datetime.now(timezone.utc)
-            update_payload = {
-                 "$set": {
-                     "status": OrderStatus.ACCEPTED.value,
-                     "confirmed_at": now_utc.isoformat(),
-                     "inventory_deducted": True
-                 },
-                 "$push": {
-                      "timeline": {
-                           "status": OrderStatus.ACCEPTED.value,
-                           "timestamp": now_utc.isoformat(),
-                           "note": acceptance_note or "Order accepted by merchant",
-                           "actor": "merchant"
-                      }
-                 }
+        # The status re-check is part of the update filter, so it is atomic.
+        async with self._get_order_lock(order_id):
+            set_fields = {
+                "status": _ACCEPTED,
+                "confirmed_at": now_iso,
+                "inventory_deducted": True
+            }
+            push_fields = {
+                 "timeline": TimelineEntry(_ACCEPTED, now_iso, acceptance_note or "Order accepted by merchant", "merchant").to_push()
             }
             if estimated_delivery:
-                 update_payload["$set"]["estimated_delivery"] = estimated_delivery.isoformat()
+                 set_fields["estimated_delivery"] = estimated_delivery.isoformat()
 
             try:
-                 await self.update_order(order_id, update_payload)
+                 updated_order = await self._apply_set_push(order_id, set_fields, push_fields, {"status": _PENDING}, now_iso)
             except Exception as e:
                 logger.error(f"Failed to update order status (inside lock) for {order_id}: {e}", exc_info=True)
                 # CRITICAL: Rollback inventory
                 logger.critical(f"Attempting inventory rollback for failed FINAL order update {order_id}...")
-                rollback_tasks = [
-                    self.inventory.update_quantity(
-                        merchant_id=merchant_id,
-                        product_id=item.get("product_id"),
-                        quantity_change=float(item.get("quantity", 0)),
-                        change_reason="order_accept_final_update_failed_rollback",
-                        role="merchant"  # v6: Specify role
-                    ) for item in items_to_deduct
-                ]
-                await asyncio.gather(*rollback_tasks, return_exceptions=True)
+                await self.inventory.batch_return_stock(
+                    merchant_id=merchant_id, items=items_to_deduct,
+                    role="merchant", change_reason="order_accept_final_update_failed_rollback"
+                )
                 raise RuntimeError(f"Failed to update order {order_id} status. Inventory rollback attempted.")
 
-        # --- Step 5: Post-Acceptance Tasks (No Lock) ---
-        updated_order = await self.db.get_order(order_id)
-        if not updated_order:
-             logger.error(f"Could not retrieve updated order {order_id} after acceptance.")
-             return order  # Return stale order as fallback
-
-        try:
-            if self.knowledge and hasattr(self.knowledge, 'update_context_after_order_accepted'):
-                 await self.knowledge.update_context_after_order_accepted(updated_order)
-        except Exception as e: logger.warning(f"Failed to update knowledge base for {order_id}: {e}")
-
-        try:
-             # v6: Use self.rules (from __init__)
-             if self.rules and hasattr(self.rules, 'evaluate_order'):
-                  await self.rules.evaluate_order(updated_order)
-        except Exception as e: logger.warning(f"Error evaluating business rules for {order_id}: {e}")
+            if not updated_order:
+                # Another process (e.g., expiry) got here first.
+                # We must roll back the inventory.
+                logger.critical(f"Order {order_id} left pending state during inventory deduction! Rolling back.")
+                await self.inventory.batch_return_stock(
+                    merchant_id=merchant_id, items=items_to_deduct,
+                    role="merchant", change_reason="order_accept_race_condition_rollback"
+                )
+                raise InvalidStatus(f"Order {order_id} state changed mid-process. Inventory rolled back.")
+
+        # --- Step 5: Post-Acceptance Tasks (No Lock, run concurrently) ---
+        await asyncio.gather(
+            self._safe_update_knowledge(updated_order),
+            self._safe_evaluate_rules(updated_order)
+        )
 
-        logger.info(f"Order {order_id} accepted by merchant {merchant_id}")
+        logger.info("Order %s accepted by merchant %s", order_id, merchant_id)
         return updated_order
 
     async def decline_order(
@@ -301,32 +752,22 @@ class OrderManagerV6:
         if not order_id or not merchant_id:
             raise ValueError("order_id and merchant_id required")
 
-        async with self._order_lock:  # Lock to prevent race condition
-            order = await self.db.get_order(order_id)
-            if not order: raise ValueError(f"Order {order_id} not found")
-            if order.get("merchant_id") != merchant_id:
-                raise ValueError(f"Unauthorized: Order does not belong to merchant {merchant_id}")
-            if order.get("status") != OrderStatus.PENDING.value:
-                raise ValueError(f"Order {order_id} is not in pending state (current: {order.get('status')})")
-
-            now_utc = datetime.now(timezone.utc)
-            update_payload = {
-                 "$set": { "status": OrderStatus.DECLINED.value, "decline_reason": decline_reason },
-                 "$push": {
-                      "timeline": {
-                           "status": OrderStatus.DECLINED.value, "timestamp": now_utc.isoformat(),
-                           "note": decline_reason or "Order declined by merchant", "actor": "merchant"
-                      }
-                 }
+        async with self._get_order_lock(order_id):  # Lock to prevent race condition
+            _, now_iso = _utc_now_pair()
+            set_fields = { "status": _DECLINED, "decline_reason": decline_reason }
+            push_fields = {
+                 "timeline": TimelineEntry(_DECLINED, now_iso, decline_reason or "Order declined by merchant", "merchant").to_push()
             }
             try:
-                await self.update_order(order_id, update_payload)
-                logger.info(f"Order {order_id} declined by {merchant_id}: {decline_reason or 'No reason'}")
-                updated_order = await self.db.get_order(order_id)
-                return updated_order or order
+                updated_order = await self._apply_set_push(order_id, set_fields, push_fields, {"merchant_id": merchant_id, "status": _PENDING}, now_iso)
             except Exception as e:
                 logger.error(f"Failed to update declined order {order_id}: {e}", exc_info=True)
                 raise
+            if not updated_order:
+                await self._validate_order_precondition(order_id, merchant_id, (_PENDING,), action="declined")
+                raise InvalidStatus(f"Order {order_id} changed state mid-process, not declined")
+            logger.info("Order %s declined by %s: %s", order_id, merchant_id, decline_reason or 'No reason')
+            return updated_order
 
     async def complete_order(
         self,
@@ -341,32 +782,22 @@ class OrderManagerV6:
         if not order_id or not merchant_id:
             raise ValueError("order_id and merchant_id required")
 
-        async with self._order_lock:
-             order = await self.db.get_order(order_id)
-             if not order: raise ValueError(f"Order {order_id} not found")
-             if order.get("merchant_id") != merchant_id:
-                  raise ValueError(f"Unauthorized: Order does not belong to merchant {merchant_id}")
-             if order.get("status") != OrderStatus.ACCEPTED.value:
-                  raise ValueError(f"Order {order_id} cannot be completed (status: {order.get('status')})")
-
-             now_utc = datetime.now(timezone.utc)
-             update_payload = {
-                  "$set": { "status": OrderStatus.COMPLETED.value, "completed_at": now_utc.isoformat() },
-                  "$push": {
-                       "timeline": {
-                            "status": OrderStatus.COMPLETED.value, "timestamp": now_utc.isoformat(),
-                            "note": completion_note or "Order completed and delivered", "actor": "merchant"
-                       }
-                  }
+        async with self._get_order_lock(order_id):
+             _, now_iso = _utc_now_pair()
+             set_fields = { "status": _COMPLETED, "completed_at": now_iso }
+             push_fields = {
+                  "timeline": TimelineEntry(_COMPLETED, now_iso, completion_note or "Order completed and delivered", "merchant").to_push()
              }
              try:
-                  await self.update_order(order_id, update_payload)
-                  logger.info(f"Order {order_id} marked as completed")
-                  updated_order = await self.db.get_order(order_id)
-                  return updated_order or order
+                  updated_order = await self._apply_set_push(order_id, set_fields, push_fields, {"merchant_id": merchant_id, "status": _ACCEPTED}, now_iso)
              except Exception as e:
                   logger.error(f"Failed to complete order {order_id}: {e}", exc_info=True)
                   raise
+             if not updated_order:
+                  await self._validate_order_precondition(order_id, merchant_id, (_ACCEPTED,), action="completed")
+                  raise InvalidStatus(f"Order {order_id} changed state mid-process, not completed")
+             logger.info("Order %s marked as completed", order_id)
+             return updated_order
 
     async def cancel_order(
         self,
@@ -382,70 +813,63 @@ class OrderManagerV6:
         if not order_id or not cancellation_reason:
             raise ValueError("order_id and cancellation_reason required")
 
-        async with self._order_lock:
-              order = await self.db.get_order(order_id)
-              if not order: raise ValueError(f"Order {order_id} not found")
-
+        async with self._get_order_lock(order_id):
+              order = await self._validate_order_precondition(
+                   order_id, None, require_merchant=False, action="cancelled",
+                   blocked_statuses=_CLOSED_STATUSES
+              )
               current_status = order.get("status")
-              if current_status in [OrderStatus.COMPLETED.value, OrderStatus.CANCELLED.value, OrderStatus.EXPIRED.value]:
-                   raise ValueError(f"Order {order_id} cannot be cancelled (status: {current_status})")
+              items = order.get("items") or []
+              merchant_id = order.get("merchant_id")
 
               inventory_returned = False
               # v6: Check inventory_deducted flag, not just status
               if order.get("inventory_deducted", False):
                    try:
-                        rollback_tasks = []
-                        for item in order.get("items", []):
-                             rollback_tasks.append(
-                                  self.inventory.update_quantity(
-                                       merchant_id=order.get("merchant_id"),
-                                       product_id=item.get("product_id"),
-                                       quantity_change=float(item.get("quantity", 0)),  # Add back
-                                       change_reason="order_cancellation_rollback",
-                                       role=cancelled_by  # v6: Pass the role
-                                  )
-                             )
-                        results = await asyncio.gather(*rollback_tasks, return_exceptions=True)
-                        if any(isinstance(r, Exception) or not r.get("success") for r in results if not isinstance(r, Exception)):
-                             logger.error(f"Error returning inventory for cancelled order {order_id}: {results}")
+                        _, results = await self.inventory.batch_return_stock(
+                             merchant_id=merchant_id,
+                             items=items,
+                             role=cancelled_by,  # v6: Pass the role
+                             change_reason="order_cancellation_rollback"
+                        )
+                        returned, failures = self._classify_rollback_results(items, results)
+                        if not returned:
+                             logger.error(f"Error returning inventory for cancelled order {order_id}: {failures}")
                         else:
                              inventory_returned = True
-                             logger.info(f"Returned inventory for cancelled order {order_id}")
+                             logger.info("Returned inventory for cancelled order %s", order_id)
                    except Exception as e:
                        logger.error(f"Error returning inventory for cancelled order {order_id}: {e}", exc_info=True)
               
               # If inventory wasn't deducted, we don't need to log its return
-              elif current_status == OrderStatus.ACCEPTED.value:
+              elif current_status == _ACCEPTED:
                    logger.warning(f"Cancelling ACCEPTED order {order_id} but inventory_deducted=False. No rollback performed.")
 
 
-              now_utc = datetime.now(timezone.utc)
-              update_payload = {
-                   "$set": {
-                       "status": OrderStatus.CANCELLED.value,
-                       "cancellation_reason": cancellation_reason,
-                       "cancelled_by": cancelled_by,
-                       # v6: Ensure inventory flag is reset if we failed to return
-                       "inventory_deducted": False if inventory_returned else order.get("inventory_deducted", False),
-                   },
-                   "$push": {
-                       "timeline": {
-                            "status": OrderStatus.CANCELLED.value, "timestamp": now_utc.isoformat(),
-                            "note": cancellation_reason, "actor": cancelled_by
-                       }
-                   }
+              _, now_iso = _utc_now_pair()
+              set_fields = {
+                  "status": _CANCELLED,
+                  "cancellation_reason": cancellation_reason,
+                  "cancelled_by": cancelled_by,
+                  # v6: Ensure inventory flag is reset if we failed to return
+                  "inventory_deducted": False if inventory_returned else order.get("inventory_deducted", False),
+              }
+              push_fields = {
+                  "timeline": TimelineEntry(_CANCELLED, now_iso, cancellation_reason, cancelled_by).to_push()
               }
               if inventory_returned:
-                   update_payload["$set"]["inventory_deducted"] = False
+                   set_fields["inventory_deducted"] = False
 
               try:
-                   await self.update_order(order_id, update_payload)
-                   logger.info(f"Order {order_id} cancelled by {cancelled_by}. Inventory returned: {inventory_returned}")
-                   updated_order = await self.db.get_order(order_id)
-                   return updated_order or order
+                   updated_order = await self._apply_set_push(order_id, set_fields, push_fields, {"status": current_status}, now_iso)
               except Exception as e:
                    logger.error(f"Failed to update cancelled order {order_id}: {e}", exc_info=True)
                    raise
+              if not updated_order:
+                   logger.critical(f"Order {order_id} changed state while being cancelled. Inventory returned: {inventory_returned}")
+                   raise InvalidStatus(f"Order {order_id} state changed mid-process, cancellation not applied")
+              logger.info("Order %s cancelled by %s. Inventory returned: %s", order_id, cancelled_by, inventory_returned)
+              return updated_order
 
     async def expire_order(self, order_id: str) -> Optional[Dict]:
         """
@@ -454,108 +878,183 @@ class OrderManagerV6:
         """
         if not order_id: raise ValueError("order_id required")
 
-        async with self._order_lock:
-             order = await self.db.get_order(order_id)
-             if not order: raise ValueError(f"Order {order_id} not found")
-             
-             # v6: Check legacy status as well
-             valid_pending_statuses = [OrderStatus.PENDING.value, "pending_confirmation"]
-             current_status = order.get("status")
-             
-             if current_status not in valid_pending_statuses:
-                  logger.warning(f"Attempted to expire non-pending order {order_id} (status: {current_status})")
-                  return order
-
-             now_utc = datetime.now(timezone.utc)
-             update_payload = {
-                  "$set": { "status": OrderStatus.EXPIRED.value },
-                  "$push": {
-                       "timeline": {
-                            "status": OrderStatus.EXPIRED.value, "timestamp": now_utc.isoformat(),
-                            "note": "Order expired due to no merchant response", "actor": "system"
-                       }
-                  }
+        async with self._get_order_lock(order_id):
+             # v6: _PENDING_STATUSES covers the legacy status as well
+             _, now_iso = _utc_now_pair()
+             set_fields = { "status": _EXPIRED }
+             push_fields = {
+                  "timeline": TimelineEntry(_EXPIRED, now_iso, "Order expired due to no merchant response", "system").to_push()
              }
              try:
-                  await self.update_order(order_id, update_payload)
-                  logger.info(f"Order {order_id} expired at {now_utc.isoformat()}")
-                  updated_order = await self.db.get_order(order_id)
-                  return updated_order
+                  updated_order = await self._apply_set_push(order_id, set_fields, push_fields, {"status": {"$in": _PENDING_STATUSES}}, now_iso)
              except Exception as e:
                   logger.error(f"Failed to expire order {order_id}: {e}", exc_info=True)
                   return None
+             if not updated_order:
+                  order = await self.db.get_order(order_id)
+                  if not order: raise ValueError(f"Order {order_id} not found")
+                  logger.warning(f"Attempted to expire non-pending order {order_id} (status: {order.get('status')})")
+                  return order
+             logger.info("Order %s expired at %s", order_id, now_iso)
+             return updated_order
+
+    @staticmethod
+    def _expired_update_spec(now_iso: str) -> Dict:
+        """Mongo update that marks an order expired (shared by the batched expiry paths)."""
+        return {
+            "$set": {"status": _EXPIRED, "updated_at": now_iso},
+            "$push": {
+                "timeline": TimelineEntry(_EXPIRED, now_iso, "Order expired due to no merchant response", "system").to_push()
+            }
+        }
+
+    async def expire_order_batched(self, order_id: str) -> bool:
+        """
+        Expire one order via the shared ExpiryBatcher: concurrent callers (e.g. a
+        ReminderSystem tick) are coalesced into a single bulk write.
+        Returns True if this call moved the order to expired.
+        """
+        if not order_id: raise ValueError("order_id required")
+        return bool(await self._expiry_batcher.add(order_id))
+
+    async def _expire_orders_bulk(self, order_ids: List[str]) -> List[str]:
+        """Expire whichever of 'order_ids' are still pending, in one write. Lock-free like the sweep."""
+        _, now_iso = _utc_now_pair()
+        expired = await self.db.bulk_expire_orders(order_ids, _PENDING_STATUSES, self._expired_update_spec(now_iso))
+        for order_id in order_ids:
+            self._order_cache.pop(order_id, None)
+        if expired:
+            self._stats_cache.clear()
+            logger.info("Batched expiry expired %s of %s orders", len(expired), len(order_ids))
+        return expired
+
+    async def sweep_expired_orders(self, limit: int = 1000) -> int:
+        """
+        Expire up to 'limit' due pending orders in one batched write.
+        Lock-free: the DB status filter makes it lose cleanly to a concurrent accept.
+        Orders created before 'expiry_time_ts' existed are left to expire_order.
+        """
+        now_utc, now_iso = _utc_now_pair()
+        expired = await self.db.expire_due_orders(
+            _PENDING_STATUSES, now_utc.timestamp(), self._expired_update_spec(now_iso), limit=limit
+        )
+        if expired:
+            self._order_cache.clear()
+            self._stats_cache.clear()
+            logger.info("Expiry sweep expired %s orders", expired)
+        return expired
+
+    async def _expiry_sweeper(self, interval_seconds: int):
+        """Background loop calling sweep_expired_orders every 'interval_seconds'."""
+        while True:
+            try:
+                await self.sweep_expired_orders()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in expiry sweep: {e}", exc_info=True)
+            await asyncio.sleep(interval_seconds)
+
+    def start_expiry_sweeper(self, interval_seconds: int = 30):
+        """
+        Start the batched expiry sweep. Opt-in: ReminderSystem's per-order expiry also
+        sends merchant/customer notifications, which a bulk sweep does not.
+        """
+        if self._sweeper_task and not self._sweeper_task.done():
+            logger.warning("Expiry sweeper already running"); return
+        self._sweeper_task = asyncio.create_task(self._expiry_sweeper(interval_seconds))
+        logger.info("Expiry sweeper started (every %ss)", interval_seconds)
+
+    async def stop_expiry_sweeper(self):
+        """Cancel the expiry sweep task, if running."""
+        if not self._sweeper_task:
+            return
+        self._sweeper_task.cancel()
+        try:
+            await self._sweeper_task
+        except asyncio.CancelledError:
+            pass
+        self._sweeper_task = None
+        logger.info("Expiry sweeper stopped")
 
     # --------------------------------------------------
     # ADMIN EXTENSIONS (from v4 spec)
     # --------------------------------------------------
 
-    async def get_all_orders_admin(self, status_filter: Optional[str] = None, limit: int = 100) -> List[Dict]:
-        """Admin: Retrieve system-wide orders."""
+    async def get_all_orders_admin(
+        self, status_filter: Optional[str] = None, limit: int = 100
+    ) -> AsyncIterator[Dict]:
+        """Admin: Stream system-wide orders from the DB cursor (stop iterating to early-exit)."""
         try:
-            # Assumes db_v6 has this method
-            return await self.db.get_all_orders(status_filter=status_filter, limit=limit)
+            async for doc in self.db.iter_orders(status_filter=status_filter, limit=limit):
+                yield doc
         except Exception as e:
-            logger.error(f"Admin failed to fetch orders: {e}"); return []
+            logger.error(f"Admin failed to fetch orders: {e}")
 
     async def force_cancel_order_admin(self, order_id: str, admin_user: str, reason: str = "policy_violation") -> Dict:
         """Admin override cancellation with audit trail and inventory rollback."""
         if not admin_user:
              raise ValueError("admin_user is required for force cancellation")
              
-        async with self._order_lock:
-            order = await self.db.get_order(order_id)
-            if not order: raise ValueError(f"Order {order_id} not found")
-            if order.get("status") in [OrderStatus.CANCELLED.value, OrderStatus.COMPLETED.value]:
+        async with self._get_order_lock(order_id):
+            order = await self._validate_order_precondition(order_id, None, require_merchant=False)
+            current_status = order.get("status")
+            items = order.get("items") or []
+            merchant_id = order.get("merchant_id")
+            if current_status in _ADMIN_CANCEL_FINAL_STATUSES:
                 logger.warning(f"Admin tried to cancel already-closed order {order_id}"); return order
 
-            inventory_returned = False
-            # Perform rollback only if inventory was actually deducted
+            _, now_iso = _utc_now_pair()
+            set_fields = {
+                "status": _CANCELLED,
+                "cancelled_by": admin_user,
+                "cancellation_reason": reason
+            }
+            push_fields = {
+                "timeline": TimelineEntry(_CANCELLED, now_iso, f"Cancelled by admin: {reason}", admin_user).to_push()
+            }
+
+            async def cancel_op(session=None):
+                updated = await self._apply_set_push(order_id, set_fields, push_fields, {"status": current_status}, now_iso, session=session)
+                if not updated:
+                    raise InvalidStatus(f"Order {order_id} state changed mid-process, cancellation not applied")
+                return updated
+
+            async def audit_op(session):
+                await self.db.record_admin_action(
+                    admin_user, "force_cancel_order", {"order_id": order_id, "reason": reason}, session=session
+                )
+
+            # Status change and audit record commit together in one transaction
+            try:
+                if self._has_record_admin_action:
+                    updated_order, _ = await self.db.atomic(cancel_op, audit_op)
+                else:
+                    updated_order = await cancel_op()
+            except Exception as e:
+                logger.critical(f"Admin cancel of order {order_id} not applied, inventory untouched: {e}")
+                raise
+
+            # Return stock only once the cancellation has committed, and only if it was deducted
             if order.get("inventory_deducted", False):
                 try:
-                    rollback_tasks = [
-                        self.inventory.update_quantity(
-                            merchant_id=order["merchant_id"],
-                            product_id=i["product_id"],
-                            quantity_change=float(i["quantity"]),
-                            change_reason="admin_forced_cancel_rollback",
-                            role="admin"  # v6: Specify admin role
-                        ) for i in order.get("items", [])
-                    ]
-                    results = await asyncio.gather(*rollback_tasks, return_exceptions=True)
-                    if any(isinstance(r, Exception) or not r.get("success") for r in results if not isinstance(r, Exception)):
-                         logger.error(f"Error returning inventory for admin cancelled order {order_id}: {results}")
+                    _, results = await self.inventory.batch_return_stock(
+                        merchant_id=merchant_id,
+                        items=items,
+                        role="admin",  # v6: Specify admin role
+                        change_reason="admin_forced_cancel_rollback"
+                    )
+                    returned, failures = self._classify_rollback_results(items, results)
+                    if not returned:
+                         logger.error(f"Error returning inventory for admin cancelled order {order_id}: {failures}")
                     else:
-                         inventory_returned = True
-                         logger.info(f"Returned inventory for admin cancelled order {order_id}")
+                         logger.info("Returned inventory for admin cancelled order %s", order_id)
+                         updated_order = await self._apply_set_push(order_id, {"inventory_deducted": False}, now_iso=now_iso) or updated_order
                 except Exception as e:
                      logger.error(f"Error returning inventory for admin cancelled order {order_id}: {e}", exc_info=True)
 
-
-            now_utc = datetime.now(timezone.utc)
-            update_payload = {
-                "$set": {
-                    "status": OrderStatus.CANCELLED.value,
-                    "cancelled_by": admin_user,
-                    "cancellation_reason": reason
-                },
-                "$push": {
-                    "timeline": {
-                        "status": OrderStatus.CANCELLED.value,
-                        "timestamp": now_utc.isoformat(),
-                        "note": f"Cancelled by admin: {reason}",
-                        "actor": admin_user
-                    }
-                }
-            }
-            if inventory_returned:
-                 update_payload["$set"]["inventory_deducted"] = False
-
-            await self.update_order(order_id, update_payload)
-            # Assumes db_v6 has this method
-            if hasattr(self.db, "record_admin_action"):
-                await self.db.record_admin_action(admin_user, "force_cancel_order", {"order_id": order_id, "reason": reason})
-            logger.info(f"Admin {admin_user} force-cancelled order {order_id}")
-            return await self.db.get_order(order_id)
+            logger.info("Admin %s force-cancelled order %s", admin_user, order_id)
+            return updated_order
 
     async def approve_order_admin(self, order_id: str, admin_user: str, note: Optional[str] = None):
         """
@@ -565,23 +1064,22 @@ class OrderManagerV6:
         """
         if not order_id or not admin_user:
             raise ValueError("order_id and admin_user required")
+        _, now_iso = _utc_now_pair()  # One timestamp for $set, $push and updated_at
 
-        # --- Step 1: Read Order (No Lock) ---
-        order = await self.db.get_order(order_id)
-        if not order:
-            raise ValueError(f"Order {order_id} not found")
+        # --- Step 1 & 2: Read Order & Validate Status (Shared Order Lock) ---
+        valid_statuses = _APPROVABLE_STATUSES
+        async with self._get_order_lock(order_id, write=False):
+            order = await self._validate_order_precondition(
+                order_id, None, valid_statuses, require_merchant=False, action="approved", cached=True
+            )
 
         merchant_id = order.get("merchant_id")
         if not merchant_id:
              raise ValueError(f"Order {order_id} missing merchant_id, cannot approve.")
 
-        # --- Step 2: Validate Status (No Lock) ---
-        valid_statuses = [OrderStatus.PENDING.value, OrderStatus.REVIEW.value]
-        if order.get("status") not in valid_statuses:
-            raise ValueError(f"Order {order_id} cannot be approved (status: {order['status']})")
-
         # --- Step 3: Deduct Inventory (No Order Lock) ---
-        items_to_deduct = order.get("items", [])
+        items = order.get("items") or []
+        items_to_deduct = sorted(items, key=lambda i: str(i.get("product_id")))
         deduction_success, deduction_results = await self.inventory.batch_deduct_stock(
             merchant_id=merchant_id,
             items=items_to_deduct,
@@ -598,87 +1096,220 @@ class OrderManagerV6:
              raise ValueError(error_msg)
 
         # --- Step 4: Update Order Status (Acquire Order Lock) ---
-        async with self._order_lock:
-            # Re-check status *inside the lock*
-            current_order_state = await self.db.get_order(order_id)
-            if current_order_state.get("status") not in valid_statuses:
-                logger.critical(f"Order {order_id} state changed to {current_order_state.get('status')} during admin approval! Rolling back.")
-                rollback_tasks = [
-                    self.inventory.update_quantity(
-                        merchant_id=merchant_id, product_id=item.get("product_id"),
-                        quantity_change=float(item.get("quantity", 0)),
-                        change_reason="admin_approve_race_condition_rollback", role="admin"
-                    ) for item in items_to_deduct
-                ]
-                await asyncio.gather(*rollback_tasks, return_exceptions=True)
-                raise ValueError(f"Order state changed mid-process (now {current_order_state.get('status')}). Inventory rolled back.")
-
-            # All clear. Commit the final status update.
-            now_utc = datetime.now(timezone.utc)
-            update_payload = {
-                 "$set": {
-                     "status": OrderStatus.ACCEPTED.value,
-                     "confirmed_at": now_utc.isoformat(),
-                     "inventory_deducted": True,
-                     "approved_by_admin": admin_user
-                 },
-                 "$push": {
-                      "timeline": {
-                           "status": OrderStatus.ACCEPTED.value,
-                           "timestamp": now_utc.isoformat(),
-                           "note": note or "Approved by admin",
-                           "actor": admin_user
-                      }
-                 }
+        # The status re-check is part of the update filter, so it is atomic.
+        async with self._get_order_lock(order_id):
+            set_fields = {
+                "status": _ACCEPTED,
+                "confirmed_at": now_iso,
+                "inventory_deducted": True,
+                "approved_by_admin": admin_user
+            }
+            push_fields = {
+                 "timeline": TimelineEntry(_ACCEPTED, now_iso, note or "Approved by admin", admin_user).to_push()
             }
 
             try:
-                 await self.update_order(order_id, update_payload)
+                 updated_order = await self._apply_set_push(order_id, set_fields, push_fields, {"status": {"$in": valid_statuses}}, now_iso)
             except Exception as e:
                 logger.error(f"Failed to update order status (inside lock) for {order_id} by admin: {e}", exc_info=True)
                 logger.critical(f"Attempting inventory rollback for failed FINAL admin approval {order_id}...")
-                rollback_tasks = [
-                    self.inventory.update_quantity(
-                        merchant_id=merchant_id, product_id=item.get("product_id"),
-                        quantity_change=float(item.get("quantity", 0)),
-                        change_reason="admin_approve_final_update_failed_rollback", role="admin"
-                    ) for item in items_to_deduct
-                ]
-                await asyncio.gather(*rollback_tasks, return_exceptions=True)
+                await self.inventory.batch_return_stock(
+                    merchant_id=merchant_id, items=items_to_deduct,
+                    role="admin", change_reason="admin_approve_final_update_failed_rollback"
+                )
                 raise RuntimeError(f"Failed to update order {order_id} status. Inventory rollback attempted.")
 
-        # --- Step 5: Post-Acceptance Tasks (No Lock) ---
-        updated_order = await self.db.get_order(order_id)
-        
-        # Assumes db_v6 has this method
-        if hasattr(self.db, "record_admin_action"):
-            await self.db.record_admin_action(admin_user, "approve_order", {"order_id": order_id})
+            if not updated_order:
+                logger.critical(f"Order {order_id} left {valid_statuses} during admin approval! Rolling back.")
+                _, results = await self.inventory.batch_return_stock(
+                    merchant_id=merchant_id, items=items_to_deduct,
+                    role="admin", change_reason="admin_approve_race_condition_rollback"
+                )
+                returned, failures = self._classify_rollback_results(items_to_deduct, results)
+                if not returned:
+                    logger.critical(f"Rollback incomplete for admin-approved order {order_id}. Manual fix needed: {failures}")
+                raise InvalidStatus(f"Order {order_id} state changed mid-process. Inventory rolled back.")
 
-        try:
-             if self.rules and hasattr(self.rules, 'evaluate_order'):
-                  await self.rules.evaluate_order(updated_order)
-        except Exception as e: logger.warning(f"Error evaluating business rules for {order_id} (admin approve): {e}")
+        # --- Step 5: Post-Acceptance Tasks (No Lock) ---
+        # Not on the correctness path: run in the background so they add no response latency
+        if self._has_record_admin_action:
+            self._spawn(self._safe_record_admin_action(admin_user, "approve_order", {"order_id": order_id}))
+        if self._has_evaluate_order:
+            self._spawn(self._safe_evaluate_rules(updated_order, "admin approve"))
 
-        logger.info(f"Admin {admin_user} approved order {order_id}")
+        logger.info("Admin %s approved order %s", admin_user, order_id)
         return updated_order
 
-    async def get_merchant_order_stats(self, merchant_id: str) -> Dict:
-        """Get summary of order statuses for a given merchant (admin view)."""
-        try:
-            # Assumes db_v6 has get_orders_by_merchant
-            orders = await self.db.get_orders_by_merchant(merchant_id=merchant_id, limit=10000) # Get all for stats
-            summary = {s.value: 0 for s in OrderStatus}
-            summary["unknown"] = 0  # Add unknown key for safety
-            
+    async def bulk_approve_admin(self, order_ids: List[str], admin_user: str, note: Optional[str] = None) -> Dict:
+        """
+        Admin approval for many orders at once: one order fetch, one stock deduction
+        per merchant and one bulk_write for all status changes.
+        A merchant whose combined deduction fails falls back to per-order
+        approve_order_admin, so one short product does not block their other orders.
+        Returns {"approved": [order_id, ...], "failed": {order_id: reason}}.
+        """
+        if not order_ids or not admin_user:
+            raise ValueError("order_ids and admin_user required")
+
+        order_ids = sorted(set(order_ids))  # Sorted: consistent lock order across orders
+        valid_statuses = _APPROVABLE_STATUSES
+        failed: Dict[str, str] = {}
+        fallback: List[str] = []
+        approved: List[str] = []
+
+        async with AsyncExitStack() as stack:
+            for oid in order_ids:
+                await stack.enter_async_context(self._get_order_lock(oid))
+
+            # --- Step 1: One fetch for every approvable order ---
+            orders = await self.db.get_orders_by_ids(order_ids, valid_statuses)
+            found = {o["order_id"] for o in orders}
+            for oid in order_ids:
+                if oid not in found:
+                    failed[oid] = f"Order {oid} not found or cannot be approved"
+
+            by_merchant: Dict[str, List[Dict]] = {}
             for o in orders:
-                status_key = o.get("status", "unknown")
-                if status_key not in summary:
-                     summary[status_key] = 0 # Handle legacy statuses
-                summary[status_key] += 1
-                
-            return {"merchant_id": merchant_id, "summary": summary, "total_orders": len(orders)}
-        except Exception as e:
-            logger.error(f"Error in get_merchant_order_stats: {e}"); return {}
+                if not o.get("merchant_id"):
+                    failed[o["order_id"]] = f"Order {o['order_id']} missing merchant_id, cannot approve."
+                    continue
+                by_merchant.setdefault(o["merchant_id"], []).append(o)
+
+            # --- Step 2: One stock deduction per merchant ---
+            to_update: List[Dict] = []
+            for merchant_id, m_orders in by_merchant.items():
+                items = sorted(
+                    (i for o in m_orders for i in o.get("items", [])), key=lambda i: str(i.get("product_id"))
+                )
+                deducted, _ = await self.inventory.batch_deduct_stock(
+                    merchant_id=merchant_id, items=items, role="admin"
+                )
+                if deducted:
+                    to_update.extend(m_orders)
+                else:
+                    fallback.extend(o["order_id"] for o in m_orders)
+
+            # --- Step 3: One bulk write for all status changes ---
+            _, now_iso = _utc_now_pair()
+            updates = [
+                (
+                    o["order_id"],
+                    {"status": {"$in": valid_statuses}},
+                    {
+                        "$set": {
+                            "status": _ACCEPTED,
+                            "confirmed_at": now_iso,
+                            "inventory_deducted": True,
+                            "approved_by_admin": admin_user,
+                            "updated_at": now_iso
+                        },
+                        "$push": {
+                            "timeline": TimelineEntry(_ACCEPTED, now_iso, note or "Approved by admin", admin_user).to_push()
+                        }
+                    }
+                )
+                for o in to_update
+            ]
+            for o in to_update:
+                self._order_cache.pop(o["order_id"], None)
+                self._stats_cache.pop(o["merchant_id"], None)
+            try:
+                modified = await self.db.bulk_update_orders_if(updates)
+            except Exception as e:
+                # The bulk_write is unordered, so some updates may have landed before it raised
+                logger.error(f"Bulk admin approval write failed: {e}", exc_info=True)
+                modified = None
+            unverified: set = set()
+            if modified == len(updates):
+                applied = {o["order_id"] for o in to_update}
+            else:
+                # Some orders changed state concurrently, or the write failed part-way;
+                # find out which writes landed.
+                try:
+                    current = await self.db.get_orders_by_ids([o["order_id"] for o in to_update])
+                    applied = {
+                        o["order_id"] for o in current
+                        if o.get("status") == _ACCEPTED and o.get("approved_by_admin") == admin_user
+                    }
+                except Exception as e:
+                    # Cannot tell which orders were accepted: keep their stock deducted
+                    logger.critical(f"Could not verify bulk approval writes, stock NOT returned: {e}", exc_info=True)
+                    applied = set()
+                    unverified = {o["order_id"] for o in to_update}
+
+            # --- Step 4: Return stock only for orders confirmed not accepted ---
+            rollback: Dict[str, List[Dict]] = {}
+            for o in to_update:
+                if o["order_id"] in applied:
+                    approved.append(o["order_id"])
+                elif o["order_id"] in unverified:
+                    failed[o["order_id"]] = f"Order {o['order_id']} approval could not be verified. Manual check needed."
+                else:
+                    failed[o["order_id"]] = f"Order {o['order_id']} state changed mid-process. Inventory rolled back."
+                    rollback.setdefault(o["merchant_id"], []).extend(o.get("items", []))
+            for merchant_id, items in rollback.items():
+                logger.critical(f"Rolling back stock for {len(items)} items of merchant {merchant_id} after bulk approval miss")
+                _, results = await self.inventory.batch_return_stock(
+                    merchant_id=merchant_id, items=items,
+                    role="admin", change_reason="admin_bulk_approve_rollback"
+                )
+                returned, failures = self._classify_rollback_results(items, results)
+                if not returned:
+                    logger.critical(f"Rollback incomplete for bulk approval of merchant {merchant_id}. Manual fix needed: {failures}")
+
+        # --- Step 5: Per-order path for merchants whose combined deduction failed (No Lock held) ---
+        for oid in fallback:
+            try:
+                await self.approve_order_admin(oid, admin_user, note)
+                approved.append(oid)
+            except (ValueError, RuntimeError) as e:
+                failed[oid] = str(e)
+
+        # --- Step 6: Post-Acceptance Tasks ---
+        bulk_approved = [oid for oid in approved if oid not in fallback]
+        if bulk_approved:
+            if self._has_record_admin_action:
+                self._spawn(self._safe_record_admin_action(admin_user, "bulk_approve_orders", {"order_ids": bulk_approved}))
+            if self._has_evaluate_order:
+                self._spawn(self._evaluate_rules_for(bulk_approved, "bulk approve"))
+
+        logger.info("Admin %s bulk-approved %s/%s orders", admin_user, len(approved), len(order_ids))
+        return {"approved": approved, "failed": failed}
+
+    async def get_merchant_order_stats(self, merchant_id: str) -> Dict:
+        """
+        Get summary of order statuses for a given merchant (admin view).
+        Served from a per-merchant cache for up to _STATS_TTL_SECONDS; any status
+        change made through this manager drops that merchant's entry.
+        """
+        cached = self._stats_cache.get(merchant_id)
+        if cached and time.monotonic() - cached[0] < _STATS_TTL_SECONDS:
+            return _copy_stats(cached[1])
+        async with self._get_stats_lock(merchant_id):
+            cached = self._stats_cache.get(merchant_id)  # Filled while we waited?
+            if cached and time.monotonic() - cached[0] < _STATS_TTL_SECONDS:
+                return _copy_stats(cached[1])
+            try:
+                if self._has_status_aggregation:
+                    counts = await self.db.aggregate_order_status_counts(merchant_id)
+                else:
+                    # Fallback: count the streamed status-only projection
+                    counts = Counter([
+                        o.get("status")
+                        async for o in self.db.iter_orders_by_merchant(merchant_id, projection={"status": 1, "_id": 0})
+                    ])
+                # None -> "unknown" (summed with any literal "unknown"); legacy statuses get their own keys
+                merged = Counter(_STATUS_ZERO_SUMMARY)
+                for status, n in counts.items():
+                    merged[status or "unknown"] += n
+                summary = dict(merged)
+                if not _STATUS_VALUES.issuperset(summary):
+                    logger.debug("Merchant %s has legacy order statuses: %s", merchant_id, sorted(summary.keys() - _STATUS_VALUES))
+                stats = {"merchant_id": merchant_id, "summary": summary, "total_orders": sum(summary.values())}
+            except Exception as e:
+                logger.error(f"Error in get_merchant_order_stats: {e}"); return {}
+            self._stats_cache[merchant_id] = (time.monotonic(), stats)
+            return _copy_stats(stats)
 
     # --------------------------------------------------
     # UTILITIES (shared, from v5)
@@ -688,11 +1319,14 @@ class OrderManagerV6:
         """Retrieve order with current status."""
         if not order_id: raise ValueError("order_id required")
         try:
-            order = await self.db.get_order(order_id)
-            if not order: raise ValueError(f"Order {order_id} not found")
-            return order
-        except Exception as e:
+            # Straight from the DB: writes outside this manager (db helpers, the
+            # reminder system's expiry path) do not invalidate _order_cache
+            async with self._get_order_lock(order_id, write=False):
+                order = await self.db.get_order(order_id)
+        except _DB_ERRORS as e:
             logger.error(f"Error retrieving order {order_id}: {e}"); raise
+        if not order: raise OrderNotFound(f"Order {order_id} not found")
+        return order
 
     async def get_customer_orders(
         self, customer_phone: str, limit: int = 10, status_filter: Optional[str] = None
@@ -701,9 +1335,10 @@ class OrderManagerV6:
         if not customer_phone: raise ValueError("customer_phone required")
         try:
             return await self.db.get_orders_by_customer(
-                customer_phone=customer_phone, limit=limit, status_filter=status_filter
+                customer_phone=customer_phone, limit=limit, status_filter=status_filter,
+                projection=_ORDER_LIST_PROJECTION
             )
-        except Exception as e:
+        except _DB_ERRORS as e:
             logger.error(f"Error retrieving customer orders: {e}"); return []
 
     async def get_merchant_orders(
@@ -713,26 +1348,52 @@ class OrderManagerV6:
         if not merchant_id: raise ValueError("merchant_id required")
         try:
             return await self.db.get_orders_by_merchant(
-                merchant_id=merchant_id, status_filter=status_filter, limit=limit
+                merchant_id=merchant_id, status_filter=status_filter, limit=limit,
+                projection=_ORDER_LIST_PROJECTION
             )
-        except Exception as e:
+        except _DB_ERRORS as e:
             logger.error(f"Error retrieving merchant orders: {e}"); return []
 
     async def get_pending_orders_for_expiry_check(self) -> List[Dict]:
         """Get all pending orders that may need expiry processing."""
         try:
             # v6: Check legacy and new pending statuses
-            pending_statuses = [OrderStatus.PENDING.value, "pending_confirmation"]
             # Assumes db_v6 has get_orders_by_statuses
-            return await self.db.get_orders_by_statuses(pending_statuses)
+            return await self.db.get_orders_by_statuses(_PENDING_STATUSES, projection=_EXPIRY_CHECK_PROJECTION)
         except Exception as e:
             logger.error(f"Error retrieving pending orders: {e}"); return []
 
+    async def get_orders_due_for_expiry(self, now: datetime, limit: int = 1000) -> List[Dict]:
+        """Pending orders whose expiry is due at 'now' (legacy orders without expiry_time_ts included)."""
+        return await self.db.get_orders_due_for_expiry(
+            _PENDING_STATUSES, now.timestamp(), projection=_EXPIRY_CHECK_PROJECTION, limit=limit
+        )
+
+    async def get_next_expiry_ts(self, now: datetime) -> Optional[float]:
+        """Epoch seconds of the earliest pending expiry after 'now', or None if there is none."""
+        return await self.db.get_next_order_expiry_ts(_PENDING_STATUSES, now.timestamp())
+
+    async def get_orders_due_for_reminder(
+        self, now: datetime, min_interval_hours: float, reminder_intervals: List[int], limit: int = 1000
+    ) -> List[Dict]:
+        """
+        Pending orders at least 'min_interval_hours' old that are still missing one
+        of 'reminder_intervals' in sent_reminders.
+        """
+        return await self.db.get_orders_due_for_reminder(
+            _PENDING_STATUSES, now - timedelta(hours=min_interval_hours), reminder_intervals,
+            projection=_EXPIRY_CHECK_PROJECTION, limit=limit
+        )
+
     def _generate_order_id(self) -> str:
-        """Generate unique order ID."""
-        timestamp = datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")
-        unique_suffix = str(uuid.uuid4().hex)[:12].upper()
-        return f"ORD-{timestamp}-{unique_suffix}"
+        """
+        Generate unique, time-sortable order ID: ORD-<UTC seconds>-<3 hex ms><12 hex random>.
+        Leading with the millisecond keeps new IDs appending to the order_id index.
+        """
+        now = time.time()
+        sec = int(now)
+        unique_suffix = f"{int((now - sec) * 1000):03X}{secrets.token_hex(6).upper()}"
+        return f"ORD-{_order_id_timestamp(sec)}-{unique_suffix}"
 
     async def format_order_receipt(self, order_id: str) -> str:
         """Generate formatted order receipt for WhatsApp."""
@@ -743,50 +1404,52 @@ class OrderManagerV6:
             logger.error(f"Error formatting receipt: {e}")
             raise ValueError(f"Could not fetch order {order_id}") from e
 
-        lines = ["*ORDER RECEIPT*", "=" * 30, f"Order ID: {order.get('order_id')}", f"Status: *{order.get('status', 'unknown').upper()}*"]
+        buf = list(_RECEIPT_HEADER); write = buf.append
+        buf.extend((f"Order ID: {order.get('order_id')}", f"Status: *{order.get('status', 'unknown').upper()}*"))
         created_at_str = order.get("created_at")
         if created_at_str:
-             dt = await self._parse_iso_datetime(created_at_str)
-             lines.append(f"Date: {dt.strftime('%d %b %Y, %I:%M %p %Z') if dt else created_at_str}")
-        else: lines.append("Date: N/A")
-        
-        lines.append("\n*ITEMS:*")
-        item_count = 0; total_calc = 0.0
-        for idx, item in enumerate(order.get("items", []), 1):
-            item_count += 1
-            name = item.get("product_name", "Unknown Item")
-            qty = float(item.get("quantity", 0))
-            unit = item.get("unit", "pcs")
-            unit_price = float(item.get("unit_price", 0.0))
-            subtotal = qty * unit_price
-            total_calc += subtotal
-            lines.append(f"*{idx}. {name}*")
-            lines.append(f"   Qty: {qty} {unit} @ Rs.{unit_price:.2f} each")
-            lines.append(f"   Subtotal: Rs.{subtotal:.2f}")
-            
-        lines.append("=" * 30)
-        lines.append(f"*TOTAL ({item_count} items): Rs.{total_calc:.2f}*")
-        
+             dt = _parse_iso_datetime(created_at_str)
+             write(f"Date: {dt.strftime('%d %b %Y, %I:%M %p %Z') if dt else created_at_str}")
+        else: write("Date: N/A")
+
+        write("\n*ITEMS:*")
+        items = order.get("items") or []
+        item_count = len(items)
+        qty, price, subtotals, total_calc = _compute_totals(items)
+        for idx, (item, q, unit_price, subtotal) in enumerate(
+            zip(items, qty.tolist(), price.tolist(), subtotals.tolist()), 1
+        ):
+            write(
+                f"*{idx}. {item.get('product_name', 'Unknown Item')}*\n"
+                f"   Qty: {q} {item.get('unit', 'pcs')} @ Rs.{unit_price:.2f} each\n"
+                f"   Subtotal: Rs.{subtotal:.2f}"
+            )
+
+        write(_SEP)
+        write(f"*TOTAL ({item_count} items): Rs.{total_calc:.2f}*")
+
         stored_total = float(order.get('total_amount', -1.0))
-        if abs(total_calc - stored_total) > 0.01:
+        # Compare in integer paise: exact, no float drift across many items
+        total_paise = int(np.rint(subtotals * 100).sum())
+        if abs(total_paise - round(stored_total * 100)) > 1:
              logger.warning(f"Order {order_id}: Calc total Rs.{total_calc:.2f} != stored Rs.{stored_total:.2f}")
-             lines.append(f"_(Stored Total: Rs.{stored_total:.2f})_")
-             
+             write(f"_(Stored Total: Rs.{stored_total:.2f})_")
+
         delivery_str = order.get("estimated_delivery")
         if delivery_str:
-             dt = await self._parse_iso_datetime(delivery_str)
-             if dt: lines.append(f"Estimated Pickup/Delivery: {dt.strftime('%d %b %Y, %I:%M %p %Z')}")
-             
-        if order.get("notes"): lines.append(f"Notes: {order['notes']}")
-        lines.append("=" * 30)
-        return "\n".join(lines)
+             dt = _parse_iso_datetime(delivery_str)
+             if dt: write(f"Estimated Pickup/Delivery: {dt.strftime('%d %b %Y, %I:%M %p %Z')}")
+
+        if order.get("notes"): write(f"Notes: {order['notes']}")
+        write(_SEP)
+        return "\n".join(buf)
 
     async def format_order_summary(self, order: Dict) -> str:
         """Generate short order summary for WhatsApp messages."""
-        items = order.get("items", [])
-        item_strings = [f"{item.get('quantity', '?')} {item.get('product_name', 'Item')}" for item in items[:3]]
-        item_list = ", ".join(item_strings)
-        extra = f"... (+{len(items) - 3} more)" if len(items) > 3 else ""
+        items = order.get("items") or []
+        n = len(items)
+        item_list = ", ".join(f"{it.get('quantity', '?')} {it.get('product_name', 'Item')}" for it in items[:3])
+        extra = f"... (+{n - 3} more)" if n > 3 else ""
         return (
             f"Order {order.get('order_id', 'N/A')}:\n"
             f"{item_list}{extra}\n"
@@ -795,11 +1458,42 @@ class OrderManagerV6:
         )
 
 
+def _compute_totals(items: List[Dict]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, float]:
+    """
+    Vectorized receipt maths: (quantities, unit prices, per-item subtotals, total).
+    One float conversion pass per column instead of per-item Python arithmetic.
+    """
+    n = len(items)
+    qty = np.fromiter((float(i.get("quantity", 0)) for i in items), dtype=np.float64, count=n)
+    price = np.fromiter((float(i.get("unit_price", 0.0)) for i in items), dtype=np.float64, count=n)
+    subtotals = qty * price
+    return qty, price, subtotals, float(subtotals.sum())
+
+
+def _copy_stats(stats: Dict) -> Dict:
+    """Caller-owned copy of a cached merchant stats entry (summary dict included)."""
+    return {**stats, "summary": dict(stats["summary"])}
+
+
+@lru_cache(maxsize=1)
+def _order_id_timestamp(epoch_sec: int) -> str:
+    """UTC YYYYmmddHHMMSS for an epoch second; cached, as bulk creates hit the same second."""
+    return time.strftime("%Y%m%d%H%M%S", time.gmtime(epoch_sec))
+
+
+def _utc_now_pair() -> Tuple[datetime, str]:
+    """Current UTC time as (datetime, ISO string), so each method formats it only once."""
+    now = datetime.now(timezone.utc)
+    return now, now.isoformat()
+
+
 # Helper function (from v5)
-async def _parse_iso_datetime(dt_str: Optional[str]) -> Optional[datetime]:
+@lru_cache(maxsize=4096)
+def _parse_iso_datetime(dt_str: Optional[str]) -> Optional[datetime]:
     """
     Parse ISO datetime string safely, handling Z suffix and timezone-naive inputs.
     Returns timezone-aware datetime in UTC, or None if invalid.
+    Pure CPU work, so it is sync; cached because receipts re-parse the same strings.
     """
     if not dt_str: return None
     try:
@@ -810,3 +1504,7 @@ async def _parse_iso_datetime(dt_str: Optional[str]) -> Optional[datetime]:
     except (ValueError, TypeError) as e:
         logger.warning(f"Invalid datetime format: {dt_str} - {e}")
         return None
+
+
+# Single cached parser, also reachable as self._parse_iso_datetime for v5-era callers
+OrderManagerV6._parse_iso_datetime = staticmethod(_parse_iso_datetime)
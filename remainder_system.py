@@ -2,17 +2,103 @@
 """
 Manages automated reminders for pending orders and handles auto-expiry.
 Runs as asyncio task in FastAPI event loop (not blocking thread).
+The loop is whatever uvicorn started; with uvicorn[standard] (which ships uvloop)
+and the default --loop auto that is uvloop. start() logs which loop is active.
 UPDATED: Fixed event loop handling, datetime deprecation, function signatures, error handling
 VERSION: 1.1.0
 """
 
 import asyncio
 import logging
-from typing import Dict, List, Optional
+import time
+from bisect import bisect_right
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timedelta, timezone
 
+import httpx
+from pymongo.errors import AutoReconnect
+
 logger = logging.getLogger(__name__)
 
+# Failures expected to clear on their own (network blips, DB failover, timeouts);
+# logged as one-line warnings instead of full tracebacks
+_TRANSIENT_ERRORS = (asyncio.TimeoutError, TimeoutError, ConnectionError, httpx.TransportError, AutoReconnect)
+
+
+def _is_transient(e: BaseException) -> bool:
+    """True for timeouts/connection errors and HTTP 429 (rate limited) responses."""
+    if isinstance(e, _TRANSIENT_ERRORS):
+        return True
+    return isinstance(e, httpx.HTTPStatusError) and e.response.status_code == 429
+
+# Message templates (plain text for the WhatsApp Cloud API); only the per-order
+# fields are filled in at send time.
+_SEP50 = "=" * 50
+_SEP40 = "=" * 40
+_REMINDER_TMPL = (
+    "ORDER REMINDER\n" + _SEP50 + "\n"
+    "Order ID: {order_id}\n"
+    "Customer: {customer}\n"
+    "Amount: Rs.{amount:.2f}\n"
+    "\n"
+    "Pending for: {pending} hours\n"
+    "Expires in: {remaining} hours\n"
+    "\n"
+    "ITEMS:{items}\n"
+    "\n"
+    "Please review and accept/decline from dashboard.\n" + _SEP50
+)
+_MERCHANT_EXPIRY_TMPL = (
+    "ORDER EXPIRED\n" + _SEP40 + "\n"
+    "Order ID: {order_id}\n"
+    "Customer: {customer}\n"
+    "Amount: Rs.{amount:.2f}\n"
+    "\n"
+    "This order expired due to no response\n"
+    "within {ttl_hours} hours.\n" + _SEP40
+)
+_MERCHANT_EXPIRY_DIGEST_TMPL = (
+    "ORDERS EXPIRED\n" + _SEP40 + "\n"
+    "{count} orders expired due to no response\n"
+    "within {ttl_hours} hours:\n"
+    "{lines}\n" + _SEP40
+)
+_CUSTOMER_EXPIRY_TMPL = (
+    "ORDER EXPIRED\n" + _SEP40 + "\n"
+    "Order ID: {order_id}\n"
+    "Amount: Rs.{amount:.2f}\n"
+    "\n"
+    "Unfortunately, your order expired as the\n"
+    "merchant did not respond within {ttl_hours} hours.\n"
+    "\n"
+    "You can place a new order anytime.\n"
+    "Sorry for the inconvenience!\n" + _SEP40
+)
+
+
+class _RateLimiter:
+    """Async token bucket: 'rate' tokens per second, bursts of up to 'capacity'."""
+
+    def __init__(self, rate: float, capacity: float):
+        if rate <= 0 or capacity < 1:
+            raise ValueError("rate must be positive and capacity at least 1")
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.last = time.monotonic()
+
+    async def acquire(self):
+        """Wait until a token is available and take it."""
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
 
 class ReminderSystem:
     """
@@ -27,7 +113,11 @@ class ReminderSystem:
         db_module, # db_module is expected here
         check_interval_seconds: int = 300,
         reminder_intervals: Optional[List[int]] = None,
-        ttl_hours: int = 24
+        ttl_hours: int = 24,
+        merchant_cache_ttl_seconds: float = 60,
+        concurrency_limit: int = 20,
+        whatsapp_rate_per_second: float = 50,
+        whatsapp_burst: int = 50
     ):
         """
         Initialize reminder system.
@@ -39,43 +129,73 @@ class ReminderSystem:
             check_interval_seconds: How often to check for reminders/expiry (default: 300 = 5 min)
             reminder_intervals: List of hours when reminders are sent (default: [2, 6, 24])
             ttl_hours: Order TTL before auto-expiry in hours (default: 24)
+            merchant_cache_ttl_seconds: How long merchant lookups are reused (default: 60)
+            concurrency_limit: Max orders processed at once per check cycle (default: 20)
+            whatsapp_rate_per_second: Sustained outbound WhatsApp messages per second (default: 50)
+            whatsapp_burst: Messages that may be sent back-to-back before pacing applies (default: 50)
 
         Raises:
             ValueError: If required methods missing or parameters invalid
         """
         # Validate order_manager has required methods
-        required_methods = [
+        required_methods = (
             "get_pending_orders_for_expiry_check",
             "expire_order",
             "get_order",
             # Need update_order to mark reminders sent
             "update_order"
-        ]
-        for method in required_methods:
-            if not hasattr(order_manager, method) or not callable(getattr(order_manager, method)):
-                raise ValueError(f"order_manager missing required method: {method}")
-
-        # Validate integrations has send_whatsapp_message
-        # Assume get_whatsapp() returns the integration object correctly
-        if not hasattr(integrations_module, "send_whatsapp_message"):
-             # Check the object returned by get_whatsapp() if integrations_module is that function
-             whatsapp_instance = integrations_module # Assuming it's already the instance
-             if not hasattr(whatsapp_instance, "send_whatsapp_message"):
-                 raise ValueError("integrations_module must have send_whatsapp_message(phone, text) method")
+        )
+        missing = [m for m in required_methods if not callable(getattr(order_manager, m, None))]
+        if missing:
+            raise ValueError(f"order_manager missing required method(s): {', '.join(missing)}")
+
+        # Resolve the WhatsApp sender once: the integration instance itself, or a module
+        # exposing it as 'whatsapp'. Send sites call the cached bound method.
+        whatsapp = integrations_module
+        if not hasattr(whatsapp, "send_whatsapp_message"):
+            whatsapp = getattr(integrations_module, "whatsapp", None)
+        send_whatsapp = getattr(whatsapp, "send_whatsapp_message", None)
+        if not callable(send_whatsapp):
+            raise ValueError("integrations_module must have send_whatsapp_message(phone, text) method")
 
         # Validate db has required methods
-        db_methods = ["get_merchant"] # Assuming db_module is the Database instance
-        for method in db_methods:
-            if not hasattr(db_module, method) or not callable(getattr(db_module, method)):
-                raise ValueError(f"db_module missing required method: {method}")
+        db_methods = ("get_merchant",) # Assuming db_module is the Database instance
+        missing = [m for m in db_methods if not callable(getattr(db_module, m, None))]
+        if missing:
+            raise ValueError(f"db_module missing required method(s): {', '.join(missing)}")
 
         self.order_manager = order_manager
         self.integrations = integrations_module # Store the whatsapp instance
+        self._send_whatsapp = send_whatsapp
+        self._send_whatsapp_bulk = getattr(whatsapp, "send_whatsapp_bulk", None) # Optional
         self.db = db_module # Store the db instance
         self.check_interval = check_interval_seconds
         self.ttl_hours = ttl_hours
+        if concurrency_limit < 1:
+            raise ValueError("concurrency_limit must be at least 1")
+        self.concurrency_limit = concurrency_limit
+        # Shared by every outbound send so bursts of reminders/expiries stay under the API limit
+        self._wa_limiter = _RateLimiter(rate=whatsapp_rate_per_second, capacity=whatsapp_burst)
         self._running = False
         self._task: Optional[asyncio.Task] = None
+        # Earliest known upcoming reminder/expiry (epoch seconds); the loop sleeps until
+        # then (bounded by check_interval). _wakeup makes a sleeping loop re-read it.
+        self._next_due_ts: Optional[float] = None
+        self._wakeup = asyncio.Event()
+        # merchant_id -> (monotonic fetch time, merchant doc or None); the per-id lock
+        # makes concurrent misses for one merchant share a single get_merchant call
+        self._merchant_cache: Dict[str, Tuple[float, Optional[Dict]]] = {}
+        self._merchant_cache_ttl = merchant_cache_ttl_seconds
+        self._merchant_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+        # Order writes queued during a check cycle, flushed together once it finishes:
+        # (order_id, reminder hour) and (order_id, computed expiry fields)
+        self._pending_reminder_updates: List[Tuple[str, int]] = []
+        self._pending_expiry_backfills: List[Tuple[str, Dict]] = []
+        # (merchant_id, customer_phone, order) for orders expired this cycle; notified in one batch
+        self._expiry_notify_queue: List[Tuple[str, str, Dict]] = []
+        # (order_id, field) -> (raw value, parsed UTC datetime, epoch seconds); reparsed
+        # only if the raw value changes
+        self._parsed_dt_cache: Dict[Tuple[str, str], Tuple[object, datetime, float]] = {}
 
         # Reminder intervals in hours (when reminders are sent after order creation)
         if reminder_intervals:
@@ -85,6 +205,10 @@ class ReminderSystem:
         else:
             self.reminder_intervals = [2, 6, 24] # Default intervals
 
+        # Wake the loop on new orders so its next-due time is recomputed
+        if hasattr(order_manager, "add_order_created_listener"):
+            order_manager.add_order_created_listener(self.notify_new_order)
+
         logger.info(
             f"ReminderSystem initialized: "
             f"check_interval={check_interval_seconds}s, "
@@ -103,7 +227,15 @@ class ReminderSystem:
 
         self._running = True
         self._task = asyncio.create_task(self._check_loop())
-        logger.info("ReminderSystem background task started")
+        # The loop is already running, so it cannot be swapped here; just report it.
+        loop_name = type(asyncio.get_running_loop()).__module__
+        if loop_name.startswith("uvloop"):
+            logger.info("ReminderSystem background task started (uvloop event loop)")
+        else:
+            logger.info(
+                f"ReminderSystem background task started ({loop_name} event loop; "
+                f"run uvicorn with --loop uvloop for faster network I/O)"
+            )
 
     async def stop(self):
         """Stop the background reminder task."""
@@ -125,11 +257,65 @@ class ReminderSystem:
         self._task = None
         logger.info("ReminderSystem stopped")
 
+    def notify_new_order(self, order: Optional[Dict] = None):
+        """
+        Tell the check loop about a new order so it does not oversleep that order's
+        first reminder/expiry. Without the order, the next check is brought forward.
+        """
+        self._note_due(self._next_due_ts_for(order) if order else time.time())
+        self._wakeup.set()
+
+    def _note_due(self, due_ts: Optional[float]):
+        """Lower the next wake-up time to 'due_ts' if it is earlier."""
+        if due_ts is not None and (self._next_due_ts is None or due_ts < self._next_due_ts):
+            self._next_due_ts = due_ts
+
+    def _next_due_ts_for(self, order: Dict, now: Optional[datetime] = None) -> Optional[float]:
+        """Epoch seconds of the order's next future expiry or unsent reminder, if any."""
+        now = now or datetime.now(timezone.utc)
+        try:
+            created_at = self._parse_dt(order, "created_at") if order.get("created_at") else None
+            if order.get("expiry_time"):
+                expiry_time = self._parse_dt(order, "expiry_time")
+            else:
+                expiry_time = created_at + timedelta(hours=self.ttl_hours) if created_at else None
+        except (ValueError, TypeError):
+            return None
+        candidates = [expiry_time] if expiry_time else []
+        if created_at:
+            sent = order.get("sent_reminders") or []
+            candidates.extend(
+                created_at + timedelta(hours=h) for h in self.reminder_intervals if h not in sent
+            )
+        future = [c.timestamp() for c in candidates if c > now]
+        return min(future) if future else None
+
+    async def _sleep_until_next_due(self):
+        """
+        Sleep for check_interval, or until the next known due time if sooner (at least
+        1s, so an overdue order that failed to process cannot spin the loop).
+        Wake-ups from notify_new_order re-evaluate the deadline.
+        """
+        started = time.time()
+        while self._running:
+            deadline = started + self.check_interval
+            if self._next_due_ts is not None:
+                deadline = min(deadline, max(started + 1.0, self._next_due_ts))
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                return
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                return
+
     async def _check_loop(self):
         """Main async loop for checking pending orders and sending reminders."""
         logger.info("ReminderSystem check loop starting.")
 
         while self._running:
+            self._next_due_ts = None  # Recomputed by this cycle
             try:
                 logger.debug("Running reminder/expiry check cycle...")
                 await self._check_all_pending_orders()
@@ -142,10 +328,10 @@ class ReminderSystem:
                 # Avoid tight loop on persistent errors
                 await asyncio.sleep(min(self.check_interval, 60)) # Sleep briefly even on error
 
-            # Sleep until the next check interval
+            # Sleep until the next order is due, or the next check interval
             if self._running: # Check running flag again before sleeping
                 try:
-                    await asyncio.sleep(self.check_interval)
+                    await self._sleep_until_next_due()
                 except asyncio.CancelledError:
                     logger.info("ReminderSystem check loop cancelled during sleep.")
                     break # Exit loop cleanly
@@ -154,6 +340,9 @@ class ReminderSystem:
 
     async def _check_all_pending_orders(self):
         """Check all pending orders for reminders and expiry."""
+        if all(hasattr(self.order_manager, m) for m in ("get_orders_due_for_expiry", "get_orders_due_for_reminder", "get_next_expiry_ts")):
+            await self._check_due_orders()
+            return
         try:
             pending_orders = await self.order_manager.get_pending_orders_for_expiry_check()
 
@@ -162,96 +351,234 @@ class ReminderSystem:
                 return
 
             logger.info(f"Checking {len(pending_orders)} pending orders for reminders/expiry")
-            # Debug: Log basic info to diagnose filter mismatches
-            try:
+            self._prune_parsed_dt_cache(pending_orders)
+            # Debug: Log basic info to diagnose filter mismatches (skipped unless DEBUG is on)
+            if logger.isEnabledFor(logging.DEBUG):
+                log_debug = logger.debug
                 for o in pending_orders:
-                    logger.debug(
-                        f"PendingOrder -> id={o.get('order_id')}, merchant_id={o.get('merchant_id')}, status={o.get('status')}"
+                    log_debug(
+                        "PendingOrder -> id=%s, merchant_id=%s, status=%s",
+                        o.get('order_id'), o.get('merchant_id'), o.get('status')
                     )
-            except Exception:
-                pass
 
             now_utc = datetime.now(timezone.utc)
-            tasks = []
+            await self._run_workers(pending_orders, self._process_single_order, now_utc)
+            note_due, next_due_for = self._note_due, self._next_due_ts_for
             for order in pending_orders:
-                tasks.append(self._process_single_order(order, now_utc))
+                note_due(next_due_for(order, now_utc))
 
-            # Process orders concurrently
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-            for i, result in enumerate(results):
-                 if isinstance(result, Exception):
-                      order_id = pending_orders[i].get("order_id", "unknown")
-                      logger.error(f"Error processing order {order_id} in gather: {result}", exc_info=result)
+            await self._flush_order_updates()
+            await self._flush_expiry_notifications()
 
 
         except Exception as e:
             logger.error(f"Error retrieving or processing pending orders: {e}", exc_info=True)
 
-    async def _process_single_order(self, order: Dict, current_time: datetime):
+    async def _check_due_orders(self):
+        """
+        Server-side filtered cycle: expire the orders the DB reports as due, then
+        remind the ones old enough to be owed a reminder. The reminder query runs
+        after the expiry pass, so just-expired orders are no longer returned.
+        """
+        try:
+            now_utc = datetime.now(timezone.utc)
+            due_expiry = await self.order_manager.get_orders_due_for_expiry(now_utc)
+            if due_expiry:
+                logger.info(f"Processing {len(due_expiry)} orders due for expiry")
+                await self._run_workers(due_expiry, self._check_and_process_expiry, now_utc)
+
+            due_reminder = await self.order_manager.get_orders_due_for_reminder(
+                now_utc, self.reminder_intervals[0], self.reminder_intervals
+            )
+            if due_reminder:
+                logger.info(f"Processing {len(due_reminder)} orders due for a reminder")
+                await self._run_workers(due_reminder, self._check_and_process_reminders, now_utc)
+
+            # Next wake-up: the earliest pending expiry, and the later reminders of the
+            # orders just reminded (other reminders are caught within check_interval)
+            note_due, next_due_for = self._note_due, self._next_due_ts_for
+            note_due(await self.order_manager.get_next_expiry_ts(now_utc))
+            for order in due_reminder:
+                note_due(next_due_for(order, now_utc))
+
+            self._prune_parsed_dt_cache(due_expiry + due_reminder)
+            await self._flush_order_updates()
+            await self._flush_expiry_notifications()
+        except Exception as e:
+            logger.error(f"Error retrieving or processing due orders: {e}", exc_info=True)
+
+    def _prune_parsed_dt_cache(self, orders: List[Dict]):
+        """Forget parsed timestamps of orders not seen this cycle."""
+        live_ids = {o.get("order_id") for o in orders}
+        if any(key[0] not in live_ids for key in self._parsed_dt_cache):
+            self._parsed_dt_cache = {
+                key: val for key, val in self._parsed_dt_cache.items() if key[0] in live_ids
+            }
+
+    async def _run_workers(self, orders: List[Dict], handler, current_time: datetime):
+        """
+        Run handler(order, current_time, now_ts) over 'orders' with a bounded worker pool: at most
+        concurrency_limit orders (and WhatsApp sends) in flight, pulling from one shared
+        iterator so a slow order does not hold up a batch.
+        """
+        order_iter = iter(orders)
+        workers = min(self.concurrency_limit, len(orders))
+        now_ts = current_time.timestamp()  # Handlers compare epoch floats, not datetimes
+        await asyncio.gather(*(self._order_worker(order_iter, handler, current_time, now_ts) for _ in range(workers)))
+
+    async def _order_worker(self, order_iter, handler, current_time: datetime, now_ts: float):
+        """Process orders from the shared iterator until it is exhausted."""
+        log_order_error = self._log_order_error
+        for order in order_iter:
+            try:
+                await handler(order, current_time, now_ts)
+            except Exception as e:
+                log_order_error(order.get('order_id', 'unknown'), "processing", e)
+
+    @staticmethod
+    def _log_order_error(order_id: Optional[str], action: str, e: Exception):
+        """Per-order failure log: a warning for transient errors, a traceback only for unexpected ones."""
+        if _is_transient(e):
+            logger.warning("Order %s: transient error while %s: %s", order_id, action, e)
+        else:
+            logger.error(f"Order {order_id}: error while {action}: {e}", exc_info=e)
+
+    async def _flush_order_updates(self):
+        """
+        Write the reminder marks and expiry backfills queued this cycle: reminder marks as
+        one server-side update per reminder hour, backfills in one bulk call.
+        """
+        reminders, self._pending_reminder_updates = self._pending_reminder_updates, []
+        backfills, self._pending_expiry_backfills = self._pending_expiry_backfills, []
+        if reminders and hasattr(self.order_manager, "mark_reminders_sent"):
+            by_hour: Dict[int, List[str]] = defaultdict(list)
+            for order_id, hour in reminders:
+                by_hour[hour].append(order_id)
+            try:
+                await self.order_manager.mark_reminders_sent(dict(by_hour))
+                for hour, order_ids in by_hour.items():
+                    logger.info(f"Marked {hour}h reminder sent for {len(order_ids)} orders")
+            except Exception as e:
+                logger.error(f"Failed to mark {len(reminders)} reminders sent: {e}", exc_info=True)
+            reminders = []
+        updates = [
+            (order_id, {"$addToSet": {"sent_reminders": hour}}) for order_id, hour in reminders
+        ] + backfills
+        if not updates:
+            return
+        if not hasattr(self.order_manager, "bulk_update_orders"):
+            # Per-order fallback: each failure is logged where it happens, the rest still apply
+            await asyncio.gather(*(self._update_order_logged(oid, data) for oid, data in updates))
+            return
+        try:
+            await self.order_manager.bulk_update_orders(updates)
+            for order_id, hour in reminders:
+                logger.info(f"Marked {hour}h reminder sent for order {order_id}")
+        except Exception as e:
+            logger.error(f"Failed to write {len(updates)} queued order updates: {e}", exc_info=True)
+
+    async def _update_order_logged(self, order_id: str, update_data: Dict):
+        """update_order that logs instead of raising (one queued update of a flush)."""
+        try:
+            await self.order_manager.update_order(order_id, update_data)
+        except Exception as e:
+            self._log_order_error(order_id, "applying queued update", e)
+
+    async def _process_single_order(self, order: Dict, current_time: datetime, now_ts: Optional[float] = None):
         """ Process reminders and expiry for a single order."""
         order_id = order.get("order_id")
         if not order_id:
             logger.warning("Found pending order with no order_id.")
             return
 
-        try:
-            # Check for expiry first
-            expired = await self._check_and_process_expiry(order, current_time)
-            if expired:
-                 return # Don't send reminders for expired orders
-
-            # If not expired, check for reminders
-            await self._check_and_process_reminders(order, current_time)
+        # Check for expiry first; failures propagate to the worker, which logs them once
+        expired = await self._check_and_process_expiry(order, current_time, now_ts)
+        if expired:
+             return # Don't send reminders for expired orders
 
-        except Exception as e:
-             logger.error(f"Failed processing order {order_id}: {e}", exc_info=True)
-             # Raise the exception so asyncio.gather can report it
-             raise
+        # If not expired, check for reminders
+        await self._check_and_process_reminders(order, current_time, now_ts)
 
 
-    async def _check_and_process_expiry(self, order: Dict, current_time: datetime) -> bool:
+    def _parse_dt(self, order: Dict, key: str) -> datetime:
+        """
+        Parse order[key] (ISO string or datetime) to an aware UTC datetime, reusing the
+        result from earlier cycles while the stored value is unchanged.
+        Raises ValueError/TypeError on a malformed value.
+        """
+        raw = order.get(key)
+        cache_key = (order.get("order_id"), key)
+        cached = self._parsed_dt_cache.get(cache_key)
+        if cached and cached[0] == raw:
+            return cached[1]
+        parsed = raw if isinstance(raw, datetime) else datetime.fromisoformat(str(raw).replace("Z", "+00:00"))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        self._parsed_dt_cache[cache_key] = (raw, parsed, parsed.timestamp())
+        return parsed
+
+    def _parse_ts(self, order: Dict, key: str) -> float:
+        """Like _parse_dt, but returns cached epoch seconds for cheap float comparisons."""
+        cached = self._parsed_dt_cache.get((order.get("order_id"), key))
+        if cached and cached[0] == order.get(key):
+            return cached[2]
+        return self._parse_dt(order, key).timestamp()
+
+    async def _check_and_process_expiry(
+        self, order: Dict, current_time: datetime, now_ts: Optional[float] = None
+    ) -> bool:
         """ Checks if an order is expired and processes it if so. Returns True if expired."""
+        if now_ts is None:
+            now_ts = current_time.timestamp()
         order_id = order.get("order_id")
         expiry_time_str = order.get("expiry_time")
-        if not expiry_time_str:
+        expiry_ts = order.get("expiry_time_ts")
+        if isinstance(expiry_ts, (int, float)):
+            pass # Stored epoch seconds: nothing to parse
+        elif not expiry_time_str:
             # Try to calculate and set default expiry if missing
             created_at_str = order.get("created_at")
             if not created_at_str:
                  logger.warning(f"Order {order_id} has no created_at or expiry_time.")
                  return False # Cannot determine expiry
             try:
-                created_at = datetime.fromisoformat(created_at_str)
-                if created_at.tzinfo is None:
-                    created_at = created_at.replace(tzinfo=timezone.utc)
+                created_at = self._parse_dt(order, "created_at")
                 expiry_time = created_at + timedelta(hours=self.ttl_hours)
                 expiry_time_str = expiry_time.isoformat()
-                # Update DB - fire and forget, log error if fails
-                asyncio.create_task(self.order_manager.update_order(order_id, {"expiry_time": expiry_time_str}))
+                expiry_ts = expiry_time.timestamp()
+                # Persisted with the end-of-cycle bulk flush
+                self._pending_expiry_backfills.append(
+                    (order_id, {"expiry_time": expiry_time_str, "expiry_time_ts": expiry_ts})
+                )
             except (ValueError, TypeError, Exception) as e:
                  logger.error(f"Error calculating/setting expiry for {order_id}: {e}")
                  return False
-
-        # Now parse the expiry time
-        try:
-            expiry_norm = str(expiry_time_str).replace("Z", "+00:00")
-            expiry_time = datetime.fromisoformat(expiry_norm)
-            if expiry_time.tzinfo is None:
-                expiry_time = expiry_time.replace(tzinfo=timezone.utc)
-        except (ValueError, TypeError):
-             logger.error(f"Invalid expiry_time format for order {order_id}: {expiry_time_str}")
-             return False # Treat as not expired if format is bad
+        else:
+            # Now parse the expiry time
+            try:
+                expiry_ts = self._parse_ts(order, "expiry_time")
+            except (ValueError, TypeError):
+                 logger.error(f"Invalid expiry_time format for order {order_id}: {expiry_time_str}")
+                 return False # Treat as not expired if format is bad
 
         # Check if expired
-        if current_time >= expiry_time:
+        if now_ts >= expiry_ts:
             logger.info(f"Order {order_id} has passed expiry time {expiry_time_str}. Processing expiry...")
-            await self._expire_order(order)
+            await self._expire_order(order, current_time)
             return True # Order was expired
         else:
              return False # Order not yet expired
 
 
-    async def _check_and_process_reminders(self, order: Dict, current_time: datetime):
+    async def _check_and_process_reminders(
+        self, order: Dict, current_time: datetime, now_ts: Optional[float] = None
+    ):
         """Check if order needs reminder and send if due."""
+        sent_reminders = set(order.get("sent_reminders") or []) # Hours already sent
+        if sent_reminders.issuperset(self.reminder_intervals):
+            return # Every reminder already sent; nothing to parse or compute
+        if now_ts is None:
+            now_ts = current_time.timestamp()
         order_id = order.get("order_id")
         created_at_str = order.get("created_at")
         if not created_at_str:
@@ -259,48 +586,43 @@ class ReminderSystem:
             return
 
         try:
-            created_at_norm = str(created_at_str).replace("Z", "+00:00")
-            created_at = datetime.fromisoformat(created_at_norm)
-            if created_at.tzinfo is None:
-                created_at = created_at.replace(tzinfo=timezone.utc)
+            created_ts = self._parse_ts(order, "created_at")
         except (ValueError, TypeError):
             logger.error(f"Invalid created_at timestamp for reminder check {order_id}: {created_at_str}")
             return
 
         # Calculate hours elapsed
-        hours_elapsed = (current_time - created_at).total_seconds() / 3600
-        sent_reminders = order.get("sent_reminders", []) # Should be list of hours
+        hours_elapsed = (now_ts - created_ts) / 3600
+        if hours_elapsed < self.reminder_intervals[0]:
+            return # Too young for the first reminder
 
-        # Find the next applicable reminder interval that hasn't been sent
+        # Find the earliest due reminder interval that hasn't been sent; intervals are
+        # sorted, so the due ones are the prefix up to bisect_right(hours_elapsed)
         next_reminder_hour = None
-        for interval_hours in self.reminder_intervals:
-            if hours_elapsed >= interval_hours and interval_hours not in sent_reminders:
+        for interval_hours in self.reminder_intervals[:bisect_right(self.reminder_intervals, hours_elapsed)]:
+            if interval_hours not in sent_reminders:
                 next_reminder_hour = interval_hours
-                break # Found the earliest due reminder
+                break
 
         if next_reminder_hour is not None:
             logger.info(f"Order {order_id} due for {next_reminder_hour}h reminder.")
             # Send reminder
-            reminder_sent = await self._send_reminder(order, int(next_reminder_hour))
+            reminder_sent = await self._send_reminder(order, int(next_reminder_hour), current_time)
 
-            # Update order ONLY if reminder was successfully sent (or attempted)
+            # Mark the order ONLY if the reminder was sent; written with the end-of-cycle
+            # bulk flush ($addToSet there keeps it idempotent)
             if reminder_sent: # Assuming _send_reminder returns True/False
-                try:
-                    # Use $addToSet to prevent duplicates if run concurrently
-                    await self.order_manager.update_order(
-                        order_id,
-                        {"$addToSet": {"sent_reminders": next_reminder_hour}}
-                    )
-                    logger.info(f"Marked {next_reminder_hour}h reminder sent for order {order_id}")
-                except Exception as e:
-                    logger.error(f"Failed to update order {order_id} after sending reminder: {e}", exc_info=True)
+                self._pending_reminder_updates.append((order_id, next_reminder_hour))
             else:
                  logger.warning(f"Did not mark reminder sent for {order_id} as send failed.")
 
 
-    async def _send_reminder(self, order: Dict, hours_elapsed: int) -> bool:
+    async def _send_reminder(
+        self, order: Dict, hours_elapsed: int, current_time: Optional[datetime] = None
+    ) -> bool:
         """
         Send reminder message to merchant via WhatsApp. Returns True on success/attempt.
+        'current_time' is the check cycle's timestamp, used for logging.
         """
         merchant_id = order.get("merchant_id")
         order_id = order.get("order_id")
@@ -310,7 +632,7 @@ class ReminderSystem:
 
         try:
             # Get merchant phone using the db instance
-            merchant_data = await self.db.get_merchant(merchant_id)
+            merchant_data = await self._get_merchant_cached(merchant_id)
             if not merchant_data:
                 # Use debug level for missing merchants in dev mode (e.g., "demo")
                 # Only warn if it's not a known dev/test merchant
@@ -329,21 +651,36 @@ class ReminderSystem:
             message = self._format_reminder_message(order, hours_elapsed)
 
             # Send via WhatsApp using the integrations instance
-            await self.integrations.send_whatsapp_message(
+            await self._wa_limiter.acquire()
+            await self._send_whatsapp(
                 phone=merchant_phone,
                 text=message
             )
             logger.info(
                 f"Reminder sent to merchant {merchant_id} (phone: {merchant_phone}) "
                 f"for order {order_id}"
+                + (f" (cycle {current_time.isoformat()})" if current_time else "")
             )
             return True # Indicate successful send
 
         except Exception as e:
-            logger.error(f"Failed sending reminder for order {order_id} to merchant {merchant_id}: {e}", exc_info=True)
+            self._log_order_error(order_id, f"sending reminder to merchant {merchant_id}", e)
             return False # Indicate send failure
 
 
+    async def _get_merchant_cached(self, merchant_id: str) -> Optional[Dict]:
+        """get_merchant with a short TTL cache; a cycle fetches each merchant at most once."""
+        cached = self._merchant_cache.get(merchant_id)
+        if cached and time.monotonic() - cached[0] < self._merchant_cache_ttl:
+            return cached[1]
+        async with self._merchant_locks[merchant_id]:
+            cached = self._merchant_cache.get(merchant_id)  # Filled while we waited?
+            if cached and time.monotonic() - cached[0] < self._merchant_cache_ttl:
+                return cached[1]
+            merchant_data = await self.db.get_merchant(merchant_id)
+            self._merchant_cache[merchant_id] = (time.monotonic(), merchant_data)
+            return merchant_data
+
     def _format_reminder_message(self, order: Dict, hours_elapsed: int) -> str:
         """
         Format reminder message for merchant.
@@ -358,42 +695,50 @@ class ReminderSystem:
         """
         remaining_hours = max(0, self.ttl_hours - hours_elapsed)
 
-        lines = [
-            "ORDER REMINDER", # Removed emoji
-            "=" * 50,
-            f"Order ID: {order.get('order_id')}",
-            f"Customer: {order.get('customer_name', order.get('customer_phone', 'Unknown'))}",
-            f"Amount: Rs.{order.get('total_amount', 0):.2f}", # Used Rs. instead of ₹
-            "",
-            f"Pending for: {int(hours_elapsed)} hours",
-            f"Expires in: {int(remaining_hours)} hours",
-            "",
-            "ITEMS:",
-        ]
-
-        # Add items
+        # Show first 5 items, one per line; built as one list and joined once
         items = order.get("items", [])
-        for idx, item in enumerate(items[:5], 1):  # Show first 5 items
-            qty = item.get("quantity", 0)
-            name = item.get("product_name", "Unknown")
-            lines.append(f"{idx}. {qty} {name}")
-
+        item_lines = [
+            f"\n{idx}. {item.get('quantity', 0)} {item.get('product_name', 'Unknown')}"
+            for idx, item in enumerate(items[:5], 1)
+        ]
         if len(items) > 5:
-            lines.append(f"... and {len(items) - 5} more items")
+            item_lines.append(f"\n... and {len(items) - 5} more items")
+        items_block = "".join(item_lines)
+
+        return _REMINDER_TMPL.format(
+            order_id=order.get('order_id'),
+            customer=order.get('customer_name', order.get('customer_phone', 'Unknown')),
+            amount=order.get('total_amount', 0),
+            pending=int(hours_elapsed),
+            remaining=int(remaining_hours),
+            items=items_block
+        )
 
-        lines.append("")
-        lines.append("Please review and accept/decline from dashboard.")
-        lines.append("=" * 50)
+    def _format_merchant_expiry_message(self, order: Dict) -> str:
+        """Format the expiry notice sent to the merchant."""
+        return _MERCHANT_EXPIRY_TMPL.format(
+            order_id=order.get("order_id"),
+            customer=order.get('customer_name', order.get('customer_phone')),
+            amount=order.get('total_amount', 0),
+            ttl_hours=self.ttl_hours
+        )
 
-        return "\n".join(lines)
+    def _format_customer_expiry_message(self, order: Dict) -> str:
+        """Format the expiry notice sent to the customer."""
+        return _CUSTOMER_EXPIRY_TMPL.format(
+            order_id=order.get("order_id"),
+            amount=order.get('total_amount', 0),
+            ttl_hours=self.ttl_hours
+        )
 
-    async def _expire_order(self, order: Dict):
+    async def _expire_order(self, order: Dict, current_time: Optional[datetime] = None):
         """
         Expire order and notify both merchant and customer.
         Handles notification failures gracefully.
 
         Args:
             order: Order dictionary to expire
+            current_time: The check cycle's timestamp, used for logging
         """
         order_id = order.get("order_id")
         merchant_id = order.get("merchant_id")
@@ -403,8 +748,15 @@ class ReminderSystem:
              return
 
         try:
-            # Update order status to expired using OrderManager
-            expired_order = await self.order_manager.expire_order(order_id)
+            if hasattr(self.order_manager, "expire_order_batched"):
+                # Coalesced with the other expiries of this check cycle into one bulk write
+                if not await self.order_manager.expire_order_batched(order_id):
+                    logger.warning(f"Order {order_id} is no longer pending; skipping expiry notifications.")
+                    return
+                expired_order = True
+            else:
+                # Update order status to expired using OrderManager
+                expired_order = await self.order_manager.expire_order(order_id)
             if not expired_order: # expire_order might return None/False if already expired
                  logger.warning(f"Order {order_id} was possibly already expired or failed to expire.")
                  # Fetch again to be sure of status before notifying
@@ -413,71 +765,76 @@ class ReminderSystem:
                       logger.error(f"Failed to confirm expiry status for order {order_id}")
                       return # Avoid sending notifications if status is wrong
 
-            logger.info(f"Order {order_id} marked as expired")
-
-            # Notify merchant (non-blocking failure)
-            asyncio.create_task(self._notify_merchant_expiry(merchant_id, order))
+            logger.info(
+                f"Order {order_id} marked as expired"
+                + (f" (cycle {current_time.isoformat()})" if current_time else "")
+            )
 
-            # Notify customer (non-blocking failure)
-            asyncio.create_task(self._notify_customer_expiry(customer_phone, order))
+            # Merchant and customer are notified by the end-of-cycle batch
+            self._expiry_notify_queue.append((merchant_id, customer_phone, order))
 
         except Exception as e:
-            logger.error(f"Error during order expiry process for {order_id}: {e}", exc_info=True)
+            self._log_order_error(order_id, "expiring", e)
 
 
-    async def _notify_merchant_expiry(self, merchant_id: str, order: Dict):
-        """ Task to notify merchant about expiry. """
-        order_id = order.get("order_id")
-        try:
-            merchant_data = await self.db.get_merchant(merchant_id)
-            if merchant_data and merchant_data.get("phone"):
-                merchant_phone = merchant_data.get("phone")
-                merchant_message = (
-                    f"ORDER EXPIRED\n" # Removed emoji
-                    f"{'=' * 40}\n"
-                    f"Order ID: {order_id}\n"
-                    f"Customer: {order.get('customer_name', order.get('customer_phone'))}\n"
-                    f"Amount: Rs.{order.get('total_amount', 0):.2f}\n" # Used Rs.
-                    f"\n"
-                    f"This order expired due to no response\n"
-                    f"within {self.ttl_hours} hours.\n"
-                    f"{'=' * 40}"
-                )
-                await self.integrations.send_whatsapp_message(
-                    phone=merchant_phone,
-                    text=merchant_message
-                )
-                logger.info(f"Expiry notification sent to merchant {merchant_id}")
-            else:
-                 logger.warning(f"Could not notify merchant {merchant_id} of expiry: No phone found.")
-        except Exception as e:
-            logger.error(f"Failed to notify merchant {merchant_id} about expired order {order_id}: {e}", exc_info=True)
-
+    async def _flush_expiry_notifications(self):
+        """
+        Notify about every order expired this cycle: one message per customer, and one
+        per merchant (a digest when several of their orders expired together).
+        """
+        queued, self._expiry_notify_queue = self._expiry_notify_queue, []
+        if not queued:
+            return
 
-    async def _notify_customer_expiry(self, customer_phone: str, order: Dict):
-        """ Task to notify customer about expiry. """
-        order_id = order.get("order_id")
-        try:
-            customer_message = (
-                f"ORDER EXPIRED\n" # Removed emoji
-                f"{'=' * 40}\n"
-                f"Order ID: {order_id}\n"
-                f"Amount: Rs.{order.get('total_amount', 0):.2f}\n" # Used Rs.
-                f"\n"
-                f"Unfortunately, your order expired as the\n"
-                f"merchant did not respond within {self.ttl_hours} hours.\n"
-                f"\n"
-                f"You can place a new order anytime.\n"
-                f"Sorry for the inconvenience!\n"
-                f"{'=' * 40}"
+        by_merchant: Dict[str, List[Dict]] = defaultdict(list)
+        messages: List[Tuple[str, str]] = []
+        labels: List[str] = []
+        for merchant_id, customer_phone, order in queued:
+            by_merchant[merchant_id].append(order)
+            messages.append((customer_phone, self._format_customer_expiry_message(order)))
+            labels.append(f"customer {customer_phone} (order {order.get('order_id')})")
+
+        merchant_ids = list(by_merchant)
+        merchants = await asyncio.gather(
+            *(self._get_merchant_cached(mid) for mid in merchant_ids), return_exceptions=True
+        )
+        for merchant_id, merchant_data in zip(merchant_ids, merchants):
+            if isinstance(merchant_data, Exception) or not merchant_data or not merchant_data.get("phone"):
+                logger.warning(f"Could not notify merchant {merchant_id} of expiry: No phone found.")
+                continue
+            orders = by_merchant[merchant_id]
+            messages.append((merchant_data["phone"], self._format_merchant_expiry_notice(orders)))
+            labels.append(f"merchant {merchant_id} ({len(orders)} orders)")
+
+        if self._send_whatsapp_bulk is not None:
+            results = await self._send_whatsapp_bulk(
+                messages, max_concurrency=self.concurrency_limit, acquire=self._wa_limiter.acquire
             )
-            await self.integrations.send_whatsapp_message(
-                phone=customer_phone,
-                text=customer_message
+        else:
+            results = await asyncio.gather(
+                *(self._send_paced(phone, text) for phone, text in messages), return_exceptions=True
             )
-            logger.info(f"Expiry notification sent to customer {customer_phone}")
-        except Exception as e:
-            logger.error(f"Failed to notify customer {customer_phone} about expired order {order_id}: {e}", exc_info=True)
+        for label, result in zip(labels, results):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to send expiry notification to {label}: {result}")
+            else:
+                logger.info(f"Expiry notification sent to {label}")
+
+    async def _send_paced(self, phone: str, text: str):
+        """Single rate-limited send (fallback when integrations has no bulk send)."""
+        await self._wa_limiter.acquire()
+        return await self._send_whatsapp(phone=phone, text=text)
+
+    def _format_merchant_expiry_notice(self, orders: List[Dict]) -> str:
+        """Merchant expiry message: the single-order notice, or a digest for several."""
+        if len(orders) == 1:
+            return self._format_merchant_expiry_message(orders[0])
+        lines = "\n".join(
+            f"- {o.get('order_id')}: {o.get('customer_name', o.get('customer_phone'))} "
+            f"(Rs.{o.get('total_amount', 0):.2f})"
+            for o in orders
+        )
+        return _MERCHANT_EXPIRY_DIGEST_TMPL.format(count=len(orders), ttl_hours=self.ttl_hours, lines=lines)
 
 
     # This method seems redundant if _check_all_pending_orders covers it
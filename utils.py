@@ -5,11 +5,17 @@ Helper functions for logging, validation, file handling, and other utilities
 
 import os
 import re
+import atexit
+import asyncio
+import functools
+import queue
 import logging
 import logging.handlers
 import tempfile
+from functools import lru_cache
+from time import monotonic, sleep
 from datetime import datetime, timezone, time # Import time
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Iterator, Iterable
 from pathlib import Path
 
 import httpx
@@ -17,12 +23,104 @@ from dotenv import load_dotenv
 import psutil # Import psutil
 import platform # Import platform
 
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:
+    # Fallback for Python < 3.9
+    from backports.zoneinfo import ZoneInfo
+
 # Load environment variables
 load_dotenv()
 
 # FIX: Define logger at the module level so all functions can access it
 logger = logging.getLogger(__name__)
 
+# Background listener that owns the file handler (see setup_logging)
+_log_listener: Optional[logging.handlers.QueueListener] = None
+
+def _stop_log_listener() -> None:
+    """Flush queued records and stop the file-logging listener thread"""
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
+
+atexit.register(_stop_log_listener)
+
+# Pre-compiled patterns for the phone/entity helpers below
+_DIGITS_PLUS_RE = re.compile(r'[^\d+]')
+_NON_DIGIT_RE = re.compile(r'\D')
+_EMAIL_RE = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+# Simple phone pattern (India focused)
+_PHONE_RE = re.compile(r'\b(?:\+?91)?[ -]?[6-9]\d{9}\b')
+# Price pattern (₹, Rs., INR)
+_PRICE_RE = re.compile(r'\b(?:₹|Rs\.?|INR)\s*[\d,]+(?:\.\d{1,2})?\b')
+# str.translate deletion tables for the common ASCII case; non-ASCII input
+# still goes through the regexes so Unicode digits are handled the same way
+_ASCII_NON_DIGITS = ''.join(chr(c) for c in range(128) if not chr(c).isdigit())
+_DIGIT_TRANS = str.maketrans('', '', _ASCII_NON_DIGITS.replace('+', ''))
+_DIGIT_ONLY_TRANS = str.maketrans('', '', _ASCII_NON_DIGITS)
+# Leading digits of Indian mobile numbers
+_INDIAN_MOBILE_PREFIXES = frozenset(('6', '7', '8', '9'))
+
+# Indian number shapes handled by format_phone_number, keyed on
+# (digit count, first digit); a formatter returns None for an invalid number
+_PHONE_FORMATTERS = {
+    # 10 digits starting 6-9: bare Indian mobile number
+    **{(10, prefix): (lambda d: "91" + d) for prefix in _INDIAN_MOBILE_PREFIXES},
+    # 0 + 10-digit Indian number
+    (11, "0"): lambda d: "91" + d[1:] if d[1] in _INDIAN_MOBILE_PREFIXES else None,
+    # 91 + 10-digit Indian number; other 9x country codes pass through
+    (12, "9"): lambda d: d if d[1] != "1" or d[2] in _INDIAN_MOBILE_PREFIXES else None,
+}
+
+@lru_cache(maxsize=16)
+def _zone(name: str) -> ZoneInfo:
+    """Resolve a timezone name once per process"""
+    return ZoneInfo(name)
+
+class FastRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    RotatingFileHandler that batches disk work for high-volume logs.
+    
+    The size check for rollover runs every CHECK_EVERY records instead of on
+    every record, so a file can overshoot maxBytes by a few records. Below
+    WARNING, the stream is only flushed every CHECK_EVERY records. Warnings
+    and errors flush right away. Closing the handler flushes the rest.
+    """
+    
+    CHECK_EVERY = 64
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._records_since_check = 0
+        self._records_since_flush = 0
+        self._defer_flush = False
+    
+    def shouldRollover(self, record: logging.LogRecord) -> int:
+        self._records_since_check += 1
+        if self._records_since_check < self.CHECK_EVERY:
+            return 0
+        self._records_since_check = 0
+        return super().shouldRollover(record)
+    
+    def emit(self, record: logging.LogRecord) -> None:
+        # emit runs under the handler lock, so the flag is not shared across threads
+        self._records_since_flush += 1
+        self._defer_flush = (
+            record.levelno < logging.WARNING and self._records_since_flush < self.CHECK_EVERY
+        )
+        try:
+            super().emit(record)
+        finally:
+            self._defer_flush = False
+    
+    def flush(self) -> None:
+        if self._defer_flush:
+            return
+        self._records_since_flush = 0
+        super().flush()
+
 def setup_logging(log_level: str = "INFO", log_file: Optional[str] = None) -> None:
     """
     Setup logging configuration for the application
@@ -31,6 +129,12 @@ def setup_logging(log_level: str = "INFO", log_file: Optional[str] = None) -> No
         log_level: Logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
         log_file: Optional log file path
     """
+    global _log_listener
+    # Already configured: basicConfig would ignore new handlers anyway, and a
+    # second listener would strand the root logger's queue handler
+    if _log_listener is not None:
+        return
+    
     # Create logs directory if it doesn't exist
     logs_dir = Path("logs")
     logs_dir.mkdir(exist_ok=True)
@@ -56,14 +160,23 @@ def setup_logging(log_level: str = "INFO", log_file: Optional[str] = None) -> No
         file_handler = logging.FileHandler(log_file)
     else:
         # Default rotating file handler
-        file_handler = logging.handlers.RotatingFileHandler(
+        file_handler = FastRotatingFileHandler(
             logs_dir / "vyaapaarai.log",
             maxBytes=10*1024*1024,  # 10MB
             backupCount=5
         )
     
     file_handler.setFormatter(logging.Formatter(log_format, date_format))
-    handlers.append(file_handler)
+    
+    # Disk writes and rollover checks happen on the listener thread; request
+    # handlers only enqueue the record
+    log_queue = queue.Queue(-1)
+    _log_listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    _log_listener.start()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    # The file handler applies the real format on the listener side
+    queue_handler.setFormatter(logging.Formatter("%(message)s"))
+    handlers.append(queue_handler)
     
     # Configure root logger
     logging.basicConfig(
@@ -83,6 +196,7 @@ def setup_logging(log_level: str = "INFO", log_file: Optional[str] = None) -> No
     # Use the module-level logger
     logger.info(f"Logging configured with level: {log_level}")
 
+@lru_cache(maxsize=4096)
 def validate_phone_number(phone: str) -> bool:
     """
     Validate phone number format.
@@ -97,7 +211,11 @@ def validate_phone_number(phone: str) -> bool:
         return False
     
     # Remove all non-digit characters, except leading +
-    digits_only = re.sub(r'[^\d+]', '', phone.strip())
+    stripped = phone.strip()
+    if stripped.isascii():
+        digits_only = stripped.translate(_DIGIT_TRANS)
+    else:
+        digits_only = _DIGITS_PLUS_RE.sub('', stripped)
     
     # Remove leading + for length check
     check_digits = digits_only
@@ -110,6 +228,7 @@ def validate_phone_number(phone: str) -> bool:
     
     return True
 
+@lru_cache(maxsize=4096)
 def format_phone_number(phone: str) -> Optional[str]:
     """
     Format phone number for WhatsApp API (E.164 format without '+')
@@ -124,27 +243,22 @@ def format_phone_number(phone: str) -> Optional[str]:
         return None
     
     # Remove all non-digit characters
-    digits_only = re.sub(r'\D', '', phone.strip())
-    
-    # Case 1: 10 digits (assume India)
-    if len(digits_only) == 10:
-        # Check if it's a valid Indian mobile number (starts with 6, 7, 8, or 9)
-        if digits_only[0] in ['6', '7', '8', '9']:
-            return "91" + digits_only
-    
-    # Case 2: 11 digits (assume 0 + 10-digit Indian number)
-    elif len(digits_only) == 11 and digits_only.startswith("0"):
-        if digits_only[1] in ['6', '7', '8', '9']:
-            return "91" + digits_only[1:]
-            
-    # Case 3: 12 digits (assume 91 + 10-digit Indian number)
-    elif len(digits_only) == 12 and digits_only.startswith("91"):
-        if digits_only[2] in ['6', '7', '8', '9']:
-            return digits_only
-            
-    # Case 4: Already includes country code (e.g., > 10 digits and not starting with 0)
-    elif len(digits_only) > 10 and not digits_only.startswith("0"):
-        return digits_only
+    stripped = phone.strip()
+    if stripped.isascii():
+        digits_only = stripped.translate(_DIGIT_ONLY_TRANS)
+    else:
+        digits_only = _NON_DIGIT_RE.sub('', stripped)
+    
+    formatter = _PHONE_FORMATTERS.get((len(digits_only), digits_only[:1]))
+    if formatter:
+        formatted = formatter(digits_only)
+    # Already includes country code (e.g., > 10 digits and not starting with 0)
+    elif len(digits_only) > 10 and digits_only[0] != "0":
+        formatted = digits_only
+    else:
+        formatted = None
+    if formatted:
+        return formatted
     
     # If none of the above, it's likely invalid or non-Indian
     logger.warning(f"Could not format phone number: {phone}")
@@ -165,8 +279,14 @@ def save_temp_file(content: bytes, extension: str = ".tmp") -> str:
     fd, temp_file_path = tempfile.mkstemp(suffix=extension)
     
     try:
-        with os.fdopen(fd, 'wb') as temp_file:
-            temp_file.write(content)
+        # Single payload: write straight to the fd, no BufferedWriter copy
+        try:
+            view = memoryview(content).cast("B")
+            written = 0
+            while written < len(view):
+                written += os.write(fd, view[written:])
+        finally:
+            os.close(fd)
         return temp_file_path
     except Exception as e:
         logger.error(f"Failed to write to temp file {temp_file_path}: {e}")
@@ -184,109 +304,154 @@ def cleanup_temp_file(file_path: str) -> None:
     if not file_path:
         return
     try:
-        if os.path.exists(file_path):
-            os.unlink(file_path)
+        os.unlink(file_path)
+    except FileNotFoundError:
+        pass
     except Exception as e:
         logger.warning(f"Failed to cleanup temp file {file_path}: {str(e)}")
 
-def parse_whatsapp_webhook(webhook_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+def _handle_text_message(message: Dict[str, Any], parsed_message: Dict[str, Any]) -> None:
+    """Extract text content"""
+    text_obj = message.get("text")
+    parsed_message["text"] = text_obj.get("body") if text_obj else None
+    logger.debug("📝 [WHATSAPP_WEBHOOK] Text message: %s", parsed_message['text'])
+
+def _handle_media_message(message: Dict[str, Any], parsed_message: Dict[str, Any]) -> None:
+    """Extract media content"""
+    media_type = parsed_message["type"]
+    media_data = message.get(media_type) or {}
+    parsed_message["media"] = {
+        "type": media_type,
+        "id": media_data.get("id"),
+        "mime_type": media_data.get("mime_type"),
+        "caption": media_data.get("caption")
+    }
+    logger.debug("🖼️ [WHATSAPP_WEBHOOK] Media message: %s", parsed_message['media'])
+
+def _handle_interactive_message(message: Dict[str, Any], parsed_message: Dict[str, Any]) -> None:
+    """Handle interactive replies (buttons and lists)"""
+    interactive_data = message.get("interactive")
+    reply_type = interactive_data.get("type") if interactive_data else None
+    if reply_type == "button_reply":
+        reply = interactive_data.get("button_reply")
+        parsed_message["text"] = reply.get("title") if reply else None
+        logger.debug("🔘 [WHATSAPP_WEBHOOK] Button reply: %s", parsed_message['text'])
+    elif reply_type == "list_reply":
+        reply = interactive_data.get("list_reply")
+        parsed_message["text"] = reply.get("title") if reply else None
+        logger.debug("📋 [WHATSAPP_WEBHOOK] List reply: %s", parsed_message['text'])
+
+_MESSAGE_TYPE_HANDLERS = {
+    "text": _handle_text_message,
+    "image": _handle_media_message,
+    "audio": _handle_media_message,
+    "video": _handle_media_message,
+    "document": _handle_media_message,
+    "interactive": _handle_interactive_message,
+}
+
+def iter_whatsapp_webhook(webhook_data: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
     """
-    Parse WhatsApp webhook payload and extract actionable messages
+    Walk a WhatsApp webhook payload and yield actionable messages as they are parsed
     
     Args:
         webhook_data: Raw webhook payload from WhatsApp
         
-    Returns:
-        List of parsed message objects
+    Yields:
+        Parsed message objects
     """
-    messages = []
+    # Per-entry/per-message tracing formats whole payloads; only pay for it at DEBUG
+    debug = logger.isEnabledFor(logging.DEBUG)
     
     try:
-        logger.info(f"🔍 [WHATSAPP_WEBHOOK] Raw webhook data: {webhook_data}")
+        if debug:
+            logger.debug("🔍 [WHATSAPP_WEBHOOK] Raw webhook data: %s", webhook_data)
         entries = webhook_data.get("entry", [])
-        logger.info(f"🔍 [WHATSAPP_WEBHOOK] Found {len(entries)} entries")
+        if debug:
+            logger.debug("🔍 [WHATSAPP_WEBHOOK] Found %s entries", len(entries))
         
         for entry_idx, entry in enumerate(entries, 1):
-            logger.info(f"🔍 [WHATSAPP_WEBHOOK] Processing entry {entry_idx}: {entry}")
+            if debug:
+                logger.debug("🔍 [WHATSAPP_WEBHOOK] Processing entry %s: %s", entry_idx, entry)
             changes = entry.get("changes", [])
-            logger.info(f"🔍 [WHATSAPP_WEBHOOK] Found {len(changes)} changes in entry")
+            if debug:
+                logger.debug("🔍 [WHATSAPP_WEBHOOK] Found %s changes in entry", len(changes))
             
             for change_idx, change in enumerate(changes, 1):
-                logger.info(f"🔍 [WHATSAPP_WEBHOOK] Processing change {change_idx}: {change}")
+                if debug:
+                    logger.debug("🔍 [WHATSAPP_WEBHOOK] Processing change %s: %s", change_idx, change)
                 value = change.get("value", {})
-                logger.info(f"🔍 [WHATSAPP_WEBHOOK] Change value keys: {list(value.keys())}")
+                if debug:
+                    logger.debug("🔍 [WHATSAPP_WEBHOOK] Change value keys: %s", list(value.keys()))
                 
                 # Check for messages
                 if "messages" in value:
-                    logger.info("✅ [WHATSAPP_WEBHOOK] Found 'messages' in value")
+                    if debug:
+                        logger.debug("✅ [WHATSAPP_WEBHOOK] Found 'messages' in value")
                     message_list = value["messages"]
-                    logger.info(f"🔍 [WHATSAPP_WEBHOOK] Processing {len(message_list)} messages")
+                    if debug:
+                        logger.debug("🔍 [WHATSAPP_WEBHOOK] Processing %s messages", len(message_list))
                     
                     for msg_idx, message in enumerate(message_list, 1):
-                        logger.info(f"🔍 [WHATSAPP_WEBHOOK] Processing message {msg_idx}: {message}")
+                        if debug:
+                            logger.debug("🔍 [WHATSAPP_WEBHOOK] Processing message %s: %s", msg_idx, message)
                         
                         # We only care about new, incoming messages
-                        if message.get("type") is None:
-                            logger.warning(f"⚠️ [WHATSAPP_WEBHOOK] Skipping message with no type: {message}")
+                        msg_type = message.get("type")
+                        if msg_type is None:
+                            logger.warning("⚠️ [WHATSAPP_WEBHOOK] Skipping message with no type: %s", message)
                             continue
                             
-                        logger.info(f"✅ [WHATSAPP_WEBHOOK] Processing message type: {message.get('type')}")
+                        if debug:
+                            logger.debug("✅ [WHATSAPP_WEBHOOK] Processing message type: %s", msg_type)
                             
                         parsed_message = {
                             "id": message.get("id"),
                             "from": message.get("from"),
                             "timestamp": message.get("timestamp"),
-                            "type": message.get("type"),
+                            "type": msg_type,
                             "text": None,
                             "media": None
                         }
                         
-                        # Extract text content
-                        if message["type"] == "text":
-                            parsed_message["text"] = message.get("text", {}).get("body")
-                            logger.info(f"📝 [WHATSAPP_WEBHOOK] Text message: {parsed_message['text']}")
-                        
-                        # Extract media content
-                        elif message["type"] in ["image", "audio", "video", "document"]:
-                            media_type = message["type"]
-                            media_data = message.get(media_type, {})
-                            parsed_message["media"] = {
-                                "type": media_type,
-                                "id": media_data.get("id"),
-                                "mime_type": media_data.get("mime_type"),
-                                "caption": media_data.get("caption")
-                            }
-                            logger.info(f"🖼️ [WHATSAPP_WEBHOOK] Media message: {parsed_message['media']}")
-                        
-                        # Handle interactive replies (buttons)
-                        elif message["type"] == "interactive":
-                            interactive_data = message.get("interactive", {})
-                            if interactive_data.get("type") == "button_reply":
-                                parsed_message["text"] = interactive_data.get("button_reply", {}).get("title")
-                                logger.info(f"🔘 [WHATSAPP_WEBHOOK] Button reply: {parsed_message['text']}")
-                            elif interactive_data.get("type") == "list_reply":
-                                parsed_message["text"] = interactive_data.get("list_reply", {}).get("title")
-                                logger.info(f"📋 [WHATSAPP_WEBHOOK] List reply: {parsed_message['text']}")
+                        # Extract type-specific content
+                        handler = _MESSAGE_TYPE_HANDLERS.get(msg_type)
+                        if handler:
+                            handler(message, parsed_message)
                         
                         # Add to list only if it has content
                         if parsed_message["text"] or parsed_message["media"]:
-                            messages.append(parsed_message)
-                            logger.info("✅ [WHATSAPP_WEBHOOK] Successfully parsed message")
+                            yield parsed_message
+                            if debug:
+                                logger.debug("✅ [WHATSAPP_WEBHOOK] Successfully parsed message")
                         else:
-                            logger.warning(f"⚠️ [WHATSAPP_WEBHOOK] Empty message content: {parsed_message}")
+                            logger.warning("⚠️ [WHATSAPP_WEBHOOK] Empty message content: %s", parsed_message)
                 
                 # Also handle status updates if needed
                 elif "statuses" in value:
-                    logger.info("ℹ️ [WHATSAPP_WEBHOOK] Processing status updates")
+                    if debug:
+                        logger.debug("ℹ️ [WHATSAPP_WEBHOOK] Processing status updates")
                     for status in value["statuses"]:
-                        logger.info(f"📊 [WHATSAPP_WEBHOOK] Status update: {status.get('status')} for {status.get('recipient_id')}")
+                        if debug:
+                            logger.debug("📊 [WHATSAPP_WEBHOOK] Status update: %s for %s", status.get('status'), status.get('recipient_id'))
                 else:
-                    logger.warning(f"⚠️ [WHATSAPP_WEBHOOK] No 'messages' or 'statuses' found in value. Available keys: {list(value.keys())}")
+                    logger.warning("⚠️ [WHATSAPP_WEBHOOK] No 'messages' or 'statuses' found in value. Available keys: %s", list(value.keys()))
                         
     except Exception as e:
-        logger.error(f"❌ [WHATSAPP_WEBHOOK] Error parsing webhook: {str(e)}", exc_info=True)
+        logger.error("❌ [WHATSAPP_WEBHOOK] Error parsing webhook: %s", e, exc_info=True)
+
+def parse_whatsapp_webhook(webhook_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Parse WhatsApp webhook payload and extract actionable messages
     
-    logger.info(f"✅ [WHATSAPP_WEBHOOK] Total messages parsed: {len(messages)}")
+    Args:
+        webhook_data: Raw webhook payload from WhatsApp
+        
+    Returns:
+        List of parsed message objects
+    """
+    messages = list(iter_whatsapp_webhook(webhook_data))
+    logger.info("✅ [WHATSAPP_WEBHOOK] Total messages parsed: %s", len(messages))
     return messages
 
 def retry_with_backoff(max_retries: int = 3, backoff_factor: float = 1.0):
@@ -297,11 +462,11 @@ def retry_with_backoff(max_retries: int = 3, backoff_factor: float = 1.0):
         max_retries: Maximum number of retry attempts
         backoff_factor: Factor for exponential backoff (e.g., 1.0 -> 1s, 2s, 4s, 8s)
     """
-    import functools
-    import time
-    import asyncio
-    
     def decorator(func):
+        # Fixed at decoration time
+        delays = tuple(backoff_factor * (1 << attempt) for attempt in range(max_retries))
+        fail_msg = f"Function {func.__name__} failed after {max_retries} retries."
+        
         @functools.wraps(func)
         async def async_wrapper(*args, **kwargs):
             last_exception = None
@@ -312,10 +477,10 @@ def retry_with_backoff(max_retries: int = 3, backoff_factor: float = 1.0):
                 except Exception as e:
                     last_exception = e
                     if attempt == max_retries:
-                        logger.error(f"Function {func.__name__} failed after {max_retries} retries.")
+                        logger.error(fail_msg)
                         break
                     
-                    wait_time = backoff_factor * (2 ** attempt)
+                    wait_time = delays[attempt]
                     logger.warning(
                         f"Attempt {attempt + 1}/{max_retries} for {func.__name__} failed, "
                         f"retrying in {wait_time:.2f}s. Error: {str(e)}"
@@ -334,15 +499,15 @@ def retry_with_backoff(max_retries: int = 3, backoff_factor: float = 1.0):
                 except Exception as e:
                     last_exception = e
                     if attempt == max_retries:
-                        logger.error(f"Function {func.__name__} failed after {max_retries} retries.")
+                        logger.error(fail_msg)
                         break
                     
-                    wait_time = backoff_factor * (2 ** attempt)
+                    wait_time = delays[attempt]
                     logger.warning(
                         f"Attempt {attempt + 1}/{max_retries} for {func.__name__} failed, "
                         f"retrying in {wait_time:.2f}s. Error: {str(e)}"
                     )
-                    time.sleep(wait_time)
+                    sleep(wait_time)
             
             raise last_exception # Re-raise the last exception
         
@@ -360,7 +525,7 @@ def calculate_business_hours(
     local_tz: str = "Asia/Kolkata", 
     start_time: time = time(9, 0), 
     end_time: time = time(18, 0), 
-    work_days: List[int] = [0, 1, 2, 3, 4, 5]
+    work_days: Iterable[int] = frozenset(range(6))
 ) -> Dict[str, Any]:
     """
     Check if a given datetime is within business hours in a specific timezone.
@@ -370,20 +535,17 @@ def calculate_business_hours(
         local_tz: The target timezone (e.g., "Asia/Kolkata" for IST)
         start_time: Business start time
         end_time: Business end time
-        work_days: List of weekdays (0=Monday, 6=Sunday)
+        work_days: Weekdays (0=Monday, 6=Sunday); any iterable, sets are used as-is
         
     Returns:
         Dictionary with business hours info
     """
-    try:
-        from zoneinfo import ZoneInfo
-    except ImportError:
-        # Fallback for Python < 3.9
-        from backports.zoneinfo import ZoneInfo
-        
+    if not isinstance(work_days, (set, frozenset)):
+        work_days = frozenset(work_days)
+    
     try:
         # Convert UTC datetime to local timezone
-        local_datetime = dt.astimezone(ZoneInfo(local_tz))
+        local_datetime = dt.astimezone(_zone(local_tz))
         
         current_time = local_datetime.time()
         current_weekday = local_datetime.weekday()
@@ -423,36 +585,40 @@ def extract_entities_from_text(text: str) -> Dict[str, List[str]]:
         "prices": []
     }
     
-    # Regex patterns
-    email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-    # Simple phone pattern (India focused)
-    phone_pattern = r'\b(?:\+?91)?[ -]?[6-9]\d{9}\b'
-    # Price pattern (₹, Rs., INR)
-    price_pattern = r'\b(?:₹|Rs\.?|INR)\s*[\d,]+(?:\.\d{1,2})?\b'
-    
     try:
-        entities["emails"] = re.findall(email_pattern, text)
+        entities["emails"] = _EMAIL_RE.findall(text)
         
         # Format phones as they are found
-        raw_phones = re.findall(phone_pattern, text)
-        entities["phones"] = [format_phone_number(p) for p in raw_phones if format_phone_number(p)]
+        raw_phones = _PHONE_RE.findall(text)
+        entities["phones"] = [f for p in raw_phones if (f := format_phone_number(p))]
         
-        entities["prices"] = re.findall(price_pattern, text)
+        entities["prices"] = _PRICE_RE.findall(text)
         
     except Exception as e:
         logger.warning(f"Error during regex entity extraction: {e}")
         
     return entities
 
+# Dashboards poll get_system_info; sample psutil at most once per TTL
+_SYSTEM_INFO_TTL_SECONDS = 1.0
+_system_info_cache: Dict[str, Any] = {"ts": 0.0, "value": None}
+
 def get_system_info() -> Dict[str, Any]:
     """Get basic system information"""
+    now = monotonic()
+    cached = _system_info_cache["value"]
+    if cached is not None and now - _system_info_cache["ts"] < _SYSTEM_INFO_TTL_SECONDS:
+        return dict(cached)
     try:
-        return {
+        info = {
             "platform": platform.system(),
             "platform_release": platform.release(),
             "cpu_percent": psutil.cpu_percent(interval=None),
             "memory_percent": psutil.virtual_memory().percent
         }
+        _system_info_cache["ts"] = now
+        _system_info_cache["value"] = info
+        return dict(info)
     except Exception as e:
         logger.warning(f"Could not get system info: {e}")
         return {"error": str(e)}
@@ -460,6 +626,16 @@ def get_system_info() -> Dict[str, Any]:
 # --- END ADDED FUNCTIONS ---
 
 # Environment validation
+_REQUIRED_ENV_VARS = (
+    "MONGO_URI",
+    "WHATSAPP_PHONE_NUMBER_ID", 
+    "WHATSAPP_ACCESS_TOKEN",
+    "WHATSAPP_WEBHOOK_VERIFY_TOKEN",
+    "WHATSAPP_APP_SECRET", # Added check for webhook secret
+    "GEMINI_API_KEY",
+    "JWT_SECRET"
+)
+
 def validate_environment() -> Dict[str, bool]:
     """
     Validate required environment variables
@@ -467,24 +643,9 @@ def validate_environment() -> Dict[str, bool]:
     Returns:
         Dictionary with validation results
     """
-    required_vars = [
-        "MONGO_URI",
-        "WHATSAPP_PHONE_NUMBER_ID", 
-        "WHATSAPP_ACCESS_TOKEN",
-        "WHATSAPP_WEBHOOK_VERIFY_TOKEN",
-        "WHATSAPP_APP_SECRET", # Added check for webhook secret
-        "GEMINI_API_KEY",
-        "JWT_SECRET"
-    ]
-    
-    results = {}
-    missing = []
-    for var in required_vars:
-        value = os.getenv(var)
-        is_present = bool(value and len(value.strip()) > 0)
-        results[var] = is_present
-        if not is_present:
-            missing.append(var)
+    env = os.environ
+    results = {var: bool((env.get(var) or "").strip()) for var in _REQUIRED_ENV_VARS}
+    missing = [var for var, is_present in results.items() if not is_present]
             
     if missing:
         logger.critical(f"Missing critical environment variables: {', '.join(missing)}")
@@ -494,6 +655,8 @@ def validate_environment() -> Dict[str, bool]:
     return results
 
 if __name__ == "__main__":
+    import json
+    
     # Test utilities
     setup_logging("DEBUG")
     print("VyaapaarAI Utilities Module Test")